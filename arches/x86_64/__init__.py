@@ -1,26 +1,36 @@
-from instructions import Instruction 
+from instructions import Instruction, flow_kind
 import memory
 import operations
 import common
 import flow.emulator
+from common.instructions import select_instructions
 
 
-def detect_flow(instructions, start_address):
+def find_blocks(instructions, address_index=None):
+    """Finds basic blocks of all the code at once."""
+    return flow.emulator.find_blocks(instructions, address_index)
+
+
+def detect_flow(instructions, start_address, address_index=None, blocks=None):
     """Creates a flat flow graph."""
-    flow_emulator = flow.emulator.SimpleEmulator(instructions, start_address)
+    flow_emulator = flow.emulator.SimpleEmulator(instructions, start_address, address_index, blocks)
     return flow_emulator.flow
 
 
-def find_function_addresses(parsed_code):
-    '''returns ints'''
+def may_mark_function(mnemonic):
+    return mnemonic == "entry" or flow_kind(mnemonic) in (flow.emulator.FLOW_CALL, flow.emulator.FLOW_UNKNOWN)
+
+
+def find_function_addresses(parsed_code, regions=None):
+    '''returns ints, leaving out calls into data regions'''
     function_addrs = []
 
-    for instruction in parsed_code:
+    for instruction in select_instructions(parsed_code, may_mark_function):
         if instruction.mnemonic == "entry":
             function_addrs.append(instruction.address)
         elif instruction.calls_function():
             function_addrs.append(instruction.function)
-    return set(function_addrs)
+    return set(address for address in function_addrs if regions is None or not regions.is_data(address))
 
 
 class MemoryStructureInstructionAnalyzer(common.MemoryStructureInstructionAnalyzer):
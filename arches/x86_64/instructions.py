@@ -43,11 +43,16 @@ def parse_memory_address(operand):
 
 
 class BaseInstruction(instructions.GenericInstruction, flow.emulator.FlowInstructionMixIn):
+    __slots__ = ()
+
     def calls_function(self):
         raise NotImplementedError
 
 
 class SimpleInstruction(BaseInstruction):
+    __slots__ = ()
+    flow_kind = flow.emulator.FLOW_NONE
+
     def jumps(self):
         return False
     
@@ -59,11 +64,16 @@ class SimpleInstruction(BaseInstruction):
 
 
 class CondJumpInstruction(BaseInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        BaseInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        
-        self.condition = mnemonic[1:]
-        self.target = parse_target(operands[0])
+    __slots__ = ('_target',)
+    flow_kind = flow.emulator.FLOW_JUMP
+
+    @property
+    def condition(self):
+        return self.mnemonic[1:]
+
+    @instructions.operand_property
+    def target(self):
+        return parse_target(self.operands[0])
 
     def jumps(self):
         return True
@@ -77,9 +87,12 @@ class CondJumpInstruction(BaseInstruction):
 
 
 class JumpInstruction(BaseInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        BaseInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.target = parse_target(operands[0])
+    __slots__ = ('_target',)
+    flow_kind = flow.emulator.FLOW_JUMP
+
+    @instructions.operand_property
+    def target(self):
+        return parse_target(self.operands[0])
 
     def jumps(self):
         return True
@@ -92,6 +105,9 @@ class JumpInstruction(BaseInstruction):
 
 
 class RetInstruction(BaseInstruction):
+    __slots__ = ()
+    flow_kind = flow.emulator.FLOW_BREAK
+
     def jumps(self):
         return False
         
@@ -104,9 +120,12 @@ class RetInstruction(BaseInstruction):
 
 class CallInstruction(BaseInstruction):
     """Doesn't support the 0x8 thing (first operand)"""
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        BaseInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.function = parse_target(operands[0])
+    __slots__ = ('_function',)
+    flow_kind = flow.emulator.FLOW_CALL
+
+    @instructions.operand_property
+    def function(self):
+        return parse_target(self.operands[0])
         
     def jumps(self):
         return False
@@ -120,6 +139,8 @@ class CallInstruction(BaseInstruction):
 
 class Repeater(BaseInstruction):
     """A proxy for repeated instructions"""
+    __slots__ = ('instruction',)
+
     repeater_names = ['repz']
     supported_insns = ['ret', 'retq']
     def __init__(self, arch, address, opcode, repeater, instruction):
@@ -163,3 +184,7 @@ instruction_map = {'ret': RetInstruction,
 
 def Instruction(address, opcode, mnemonic, operands):
     return instructions.Instruction(machine.Architecture, address, opcode, mnemonic, operands, instruction_map, SimpleInstruction)
+
+
+def flow_kind(mnemonic):
+    return instructions.get_flow_kind(mnemonic, instruction_map, SimpleInstruction)
@@ -1,4 +1,5 @@
 import graphs
+from links import Links
 
 def indent(text, prefix='    '):
     return '\n'.join(prefix + se 
@@ -10,8 +11,8 @@ class Closure:
     """Represents a mess of flow. Ideally, it should not contain any subgraphs possible to collapse into subelements. Flow is defined by entry and exit, which are the graph nodes.
     """
     def __init__(self, parent):
-        self.preceding = []
-        self.following = []
+        self.preceding = Links()
+        self.following = Links()
         self.parent = parent
 
     def replace_following(self, replaced, replacing):
@@ -117,7 +118,7 @@ class LooseMess(Closure):
                         if preceding not in self.closures:
                             beginning.preceding.remove(preceding)
                             beginning.preceding.append(self.begin)
-            self.begin.following = following
+            self.begin.following = Links(following)
                             
         if len(endings) > 1:
             preceding = []
@@ -130,7 +131,7 @@ class LooseMess(Closure):
                         if following not in self.closures:
                             ending.following.remove(following)
                             ending.following.append(self.end)
-            self.end.preceding = preceding
+            self.end.preceding = Links(preceding)
     
     def replace_closures(self, replaced, replacing):
         """Replaces multiple closures with a single one"""
@@ -159,7 +160,7 @@ class LooseMess(Closure):
     def reduce_straightlinks(self):
         """Finds all chains ...A->B... and wraps them into finished bananas."""
         return
-        for node in graphs.iternodes(self.begin):
+        for node in graphs.dfs_preorder(self.begin):
             if len(node.following) == 1 and not node is self.end:
                 next = node.following[0]
                 if len(next.preceding) == 1 and not node is self.begin:
@@ -173,14 +174,14 @@ class LooseMess(Closure):
                     if node is self.begin:
                         self.begin = banana
                     else:
-                        banana.preceding = node.preceding[:]
+                        banana.preceding = Links(node.preceding)
                         for preceding in banana.preceding:
                             preceding.following.remove(node)
                             preceding.following.append(banana)
                     if next is self.end:
                         self.end = banana
                     else:
-                        banana.following = next.following[:]
+                        banana.following = Links(next.following)
                         for following in banana.following:
                             following.preceding.remove(next)
                             following.preceding.append(banana)
@@ -233,14 +234,12 @@ class ConnectedMess(Closure):
         self.connections = bulge.connections.closures[:]
         for source, branch in bulge.connections.trees:
             self.connections.append((source, None))
-        
+        self.followers = {}
+        for source, destination in self.connections:
+            self.followers.setdefault(source, []).append(destination)
     
     def get_followers(self, closure):
-        followers = []
-        for source, destination in self.connections:
-            if source == closure:
-                followers.append(destination)
-        return followers
+        return self.followers.get(closure, [])[:]
     
     def __str__(self):
         return '{' + str(len(self.connections)) + 'x | ' + ', '.join(map(str, self.closures)) + '}'
@@ -0,0 +1,108 @@
+"""Graphs with nodes numbered by small integers and edges kept in flat arrays.
+
+A CompactGraph is a snapshot of the part of an object graph reachable from a root, taken once with a follow function. Analyses walk it by list indexing instead of calling the follow function and hashing nodes at every step, and map their results back to nodes at the end.
+Successors of node i are targets[offsets[i]:offsets[i + 1]], in the order given by the follow function. Predecessors are stored the same way.
+"""
+
+import array
+
+
+def follow_following(node):
+    return node.following
+
+
+def follow_following_edges(node):
+    return (((node, next), next) for next in node.following)
+
+
+class CompactGraph:
+    def __init__(self, nodes, offsets, targets):
+        """Takes nodes by id and successor arrays. Use snapshot to build one from an object graph."""
+        self.nodes = nodes
+        self.ids = dict((node, i) for i, node in enumerate(nodes))
+        self.offsets = offsets
+        self.targets = targets
+        self.pred_offsets, self.sources = self.invert(len(nodes), offsets, targets)
+
+    @staticmethod
+    def invert(count, offsets, targets):
+        """Returns predecessor arrays, each list of predecessors in increasing id order."""
+        pred_offsets = array.array('l', [0] * (count + 1))
+        for target in targets:
+            pred_offsets[target + 1] += 1
+        for i in xrange(count):
+            pred_offsets[i + 1] += pred_offsets[i]
+        positions = pred_offsets[:-1]
+        sources = array.array('l', [0] * len(targets))
+        for source in xrange(count):
+            for target in targets[offsets[source]:offsets[source + 1]]:
+                sources[positions[target]] = source
+                positions[target] += 1
+        return pred_offsets, sources
+
+    @classmethod
+    def snapshot(cls, root, follow_func):
+        """Numbers nodes reachable from root in order of discovery, root being 0."""
+        nodes = [root]
+        ids = {root: 0}
+        offsets = array.array('l', [0])
+        targets = array.array('l')
+        i = 0
+        while i < len(nodes):
+            for next in follow_func(nodes[i]):
+                try:
+                    targets.append(ids[next])
+                except KeyError:
+                    ids[next] = len(nodes)
+                    targets.append(len(nodes))
+                    nodes.append(next)
+            offsets.append(len(targets))
+            i += 1
+        return cls(nodes, offsets, targets)
+
+    def reversed(self, root, root_successors):
+        """Returns the graph with edges turned around and an extra node root, leading to nodes with ids root_successors. Other ids stay the same and root gets the last one."""
+        count = len(self.nodes)
+        offsets = array.array('l', self.pred_offsets)
+        offsets.append(offsets[-1] + len(root_successors))
+        targets = array.array('l', self.sources)
+        targets.extend(root_successors)
+        return CompactGraph(self.nodes + [root], offsets, targets)
+
+    def successors(self, node_id):
+        return self.targets[self.offsets[node_id]:self.offsets[node_id + 1]]
+
+    def predecessors(self, node_id):
+        return self.sources[self.pred_offsets[node_id]:self.pred_offsets[node_id + 1]]
+
+    def sinks(self):
+        """Returns ids of nodes without successors."""
+        offsets = self.offsets
+        return [i for i in xrange(len(self.nodes)) if offsets[i] == offsets[i + 1]]
+
+    def postorder(self, root_id=0):
+        """Returns ids of nodes reachable from root_id in depth-first postorder, successors being visited in their order."""
+        offsets = self.offsets
+        targets = self.targets
+        visited = [False] * len(self.nodes)
+        visited[root_id] = True
+        order = []
+        stack = [(root_id, offsets[root_id])]
+        while stack:
+            node, position = stack[-1]
+            end = offsets[node + 1]
+            while position < end:
+                next = targets[position]
+                position += 1
+                if not visited[next]:
+                    visited[next] = True
+                    stack[-1] = (node, position)
+                    stack.append((next, offsets[next]))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+        return order
+
+    def __len__(self):
+        return len(self.nodes)
@@ -0,0 +1,282 @@
+"""Cycle equivalence classes of flow graph edges.
+
+Follows Johnson, Pearson and Pingali ("The Program Structure Tree: Computing Control Regions in Linear Time").
+The graph gets a virtual end, joined from all nodes without followers, and a return edge from the end back to the head. Two edges are then cycle equivalent - lie on the same cycles - exactly when one dominates the other and the other post-dominates it. Equivalence classes are found in one undirected depth-first walk, keeping the brackets (edges going up the walk tree) over every tree edge in linked lists.
+Each pair of consecutive edges of a class bounds a canonical single-entry single-exit region, and those never overlap partially, so a directed walk nests them into the program structure tree.
+"""
+
+from compact_graph import follow_following_edges
+from dominators import VirtualNode
+
+
+class Bracket(object):
+    __slots__ = ['edge', 'prev', 'next', 'recent_size', 'recent_class']
+
+    def __init__(self, edge):
+        self.edge = edge
+        self.prev = None
+        self.next = None
+        self.recent_size = -1
+        self.recent_class = None
+
+
+class BracketList:
+    """Doubly linked list of brackets with constant time push, delete and concatenation. The top is the most recently pushed."""
+    def __init__(self):
+        self.top = None
+        self.bottom = None
+        self.size = 0
+
+    def push(self, bracket):
+        bracket.prev = None
+        bracket.next = self.top
+        if self.top is None:
+            self.bottom = bracket
+        else:
+            self.top.prev = bracket
+        self.top = bracket
+        self.size += 1
+
+    def delete(self, bracket):
+        if bracket.prev is None:
+            self.top = bracket.next
+        else:
+            bracket.prev.next = bracket.next
+        if bracket.next is None:
+            self.bottom = bracket.prev
+        else:
+            bracket.next.prev = bracket.prev
+        bracket.prev = bracket.next = None
+        self.size -= 1
+
+    def concat(self, other):
+        """Puts brackets of other below own ones. other must not be used afterwards."""
+        if other.top is None:
+            return
+        if self.top is None:
+            self.top = other.top
+        else:
+            self.bottom.next = other.top
+            other.top.prev = self.bottom
+        self.bottom = other.bottom
+        self.size += other.size
+
+
+class SESERegion:
+    """Region entered only through the entry edge and left only through the exit edge. The root region is the whole graph and has neither.
+    children are the regions nested right inside, in the order a directed walk enters them.
+    """
+    def __init__(self, entry, exit):
+        self.entry = entry
+        self.exit = exit
+        self.parent = None
+        self.children = []
+
+    def __str__(self):
+        return 'SESE({0}, {1})'.format(self.entry, self.exit)
+
+    __repr__ = __str__
+
+
+class CycleEquivalence:
+    """Cycle equivalence classes of edges of the graph reachable from head. Edges of class i, in dominance order, are listed in members[i]. Canonical regions are nested under root.
+    follow_func returns (edge, next node) pairs like in common.graphs.iteredges. Edges must be distinct. Edges leading to the virtual end are None in the results.
+    Every node should be able to reach the end. Edges of infinite loops get classes that don't mean much.
+    """
+    def __init__(self, head, follow_func=follow_following_edges):
+        self.end = VirtualNode('end')
+        self.build_graph(head, follow_func)
+        self.find_classes()
+        self.order_classes()
+        self.nest_regions()
+
+    def build_graph(self, head, follow_func):
+        """Numbers nodes and edges. The last node is the end and the last edge the return edge."""
+        nodes = [head]
+        ids = {head: 0}
+        sources = []
+        targets = []
+        edges = []
+        outgoing = []
+        i = 0
+        while i < len(nodes):
+            out = []
+            for edge, next in follow_func(nodes[i]):
+                try:
+                    next_id = ids[next]
+                except KeyError:
+                    next_id = ids[next] = len(nodes)
+                    nodes.append(next)
+                out.append(len(edges))
+                sources.append(i)
+                targets.append(next_id)
+                edges.append(edge)
+            outgoing.append(out)
+            i += 1
+
+        end_id = len(nodes)
+        nodes.append(self.end)
+        for node_id in xrange(end_id):
+            if not outgoing[node_id]:
+                outgoing[node_id].append(len(edges))
+                sources.append(node_id)
+                targets.append(end_id)
+                edges.append(None)
+        outgoing.append([])
+        self.return_edge = len(edges)
+        sources.append(end_id)
+        targets.append(0)
+        edges.append(None)
+
+        self.nodes = nodes
+        self.edges = edges
+        self.sources = sources
+        self.targets = targets
+        self.outgoing = outgoing
+
+    def find_classes(self):
+        """Gives every edge a cycle equivalence class number in self.classes."""
+        sources = self.sources
+        targets = self.targets
+        count = len(self.nodes)
+        incident = [[] for i in xrange(count)]
+        for edge_id in xrange(len(sources)):
+            incident[sources[edge_id]].append(edge_id)
+            if targets[edge_id] != sources[edge_id]:
+                incident[targets[edge_id]].append(edge_id)
+
+        classes = [None] * len(sources)
+        self.class_count = 0
+        def new_class():
+            self.class_count += 1
+            return self.class_count - 1
+
+        # undirected depth-first walk, finding the spanning tree and the brackets
+        number = [-1] * count
+        preorder = []
+        parent_edge = [None] * count
+        children = [[] for i in xrange(count)]
+        brackets_up = [[] for i in xrange(count)] # from the node to its ancestors
+        brackets_down = [[] for i in xrange(count)] # from descendants to the node
+        number[0] = 0
+        preorder.append(0)
+        stack = [(0, iter(incident[0]))]
+        while stack:
+            node, edge_ids = stack[-1]
+            for edge_id in edge_ids:
+                if edge_id == parent_edge[node]:
+                    continue
+                other = targets[edge_id] if sources[edge_id] == node else sources[edge_id]
+                if other == node:
+                    classes[edge_id] = new_class() # self loops are only on their own cycle
+                elif number[other] < 0:
+                    number[other] = len(preorder)
+                    preorder.append(other)
+                    parent_edge[other] = edge_id
+                    children[node].append(other)
+                    stack.append((other, iter(incident[other])))
+                    break
+                elif number[other] < number[node]:
+                    bracket = Bracket(edge_id)
+                    brackets_up[node].append(bracket)
+                    brackets_down[other].append(bracket)
+            else:
+                stack.pop()
+
+        # bottom-up over the tree, collecting brackets above every tree edge
+        unreached = count
+        hi = [unreached] * count
+        capping = [[] for i in xrange(count)]
+        bracket_lists = [None] * count
+        for node in reversed(preorder):
+            hi0 = min([number[sources[b.edge] if targets[b.edge] == node else targets[b.edge]] for b in brackets_up[node]] or [unreached])
+            hi1 = unreached
+            hichild = None
+            for child in children[node]:
+                if hi[child] < hi1:
+                    hi1 = hi[child]
+                    hichild = child
+            hi[node] = min(hi0, hi1)
+            hi2 = min([hi[child] for child in children[node] if child != hichild] or [unreached])
+
+            blist = BracketList()
+            for child in children[node]:
+                blist.concat(bracket_lists[child])
+                bracket_lists[child] = None
+            for bracket in capping[node]:
+                blist.delete(bracket)
+            for bracket in brackets_down[node]:
+                blist.delete(bracket)
+                if classes[bracket.edge] is None:
+                    classes[bracket.edge] = new_class()
+            for bracket in brackets_up[node]:
+                blist.push(bracket)
+            if hi2 < hi0 and hi2 < number[node]:
+                bracket = Bracket(None)
+                capping[preorder[hi2]].append(bracket)
+                blist.push(bracket)
+
+            if node != 0:
+                edge_id = parent_edge[node]
+                top = blist.top
+                if top is None:
+                    classes[edge_id] = new_class() # a bridge, unreachable from the end
+                else:
+                    if top.recent_size != blist.size:
+                        top.recent_size = blist.size
+                        top.recent_class = new_class()
+                    classes[edge_id] = top.recent_class
+                    if top.recent_size == 1 and top.edge is not None:
+                        classes[top.edge] = top.recent_class
+            bracket_lists[node] = blist
+        self.classes = classes
+
+    def walk_edges(self):
+        """Yields (source, edge id, target) in directed depth-first order from the head, without the return edge."""
+        outgoing = self.outgoing
+        targets = self.targets
+        visited = [False] * len(self.nodes)
+        visited[0] = True
+        stack = [(0, iter(outgoing[0]))]
+        while stack:
+            node, edge_ids = stack[-1]
+            for edge_id in edge_ids:
+                target = targets[edge_id]
+                yield node, edge_id, target
+                if not visited[target]:
+                    visited[target] = True
+                    stack.append((target, iter(outgoing[target])))
+                    break
+            else:
+                stack.pop()
+
+    def order_classes(self):
+        """Lists edges of every class in dominance order, which is the order a directed walk reaches them."""
+        members = [[] for i in xrange(self.class_count)]
+        for source, edge_id, target in self.walk_edges():
+            members[self.classes[edge_id]].append(edge_id)
+        self.members = members
+
+    def nest_regions(self):
+        """Builds the tree of canonical regions under self.root. Regions that a directed walk enters while inside another one are nested in it."""
+        edges = self.edges
+        entered = {}
+        exited = {}
+        for edge_ids in self.members:
+            for entry, exit in zip(edge_ids, edge_ids[1:]):
+                entered[entry] = exited[exit] = SESERegion(edges[entry], edges[exit])
+
+        self.root = SESERegion(None, None)
+        node_regions = [None] * len(self.nodes)
+        node_regions[0] = self.root
+        for source, edge_id, target in self.walk_edges():
+            region = node_regions[source]
+            if edge_id in exited:
+                region = exited[edge_id].parent
+            if edge_id in entered:
+                child = entered[edge_id]
+                child.parent = region
+                region.children.append(child)
+                region = child
+            if node_regions[target] is None:
+                node_regions[target] = region
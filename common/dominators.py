@@ -0,0 +1,139 @@
+"""Dominator and post-dominator trees.
+
+Both are computed with the iterative algorithm of Cooper, Harvey and Kennedy ("A Simple, Fast Dominance Algorithm") over the part of the graph reachable from the root. Once built, a tree answers "does a dominate b" in O(1) using entry/exit numbers of the tree walk.
+The graph is described by a follow function returning successors of a node, so the trees work equally on raw flow graphs and on "ordered" closure graphs. It's taken into a CompactGraph once, and the algorithm runs on node ids.
+"""
+
+from compact_graph import CompactGraph, follow_following
+
+
+def find_idoms(graph, root_id):
+    """Returns the immediate dominator id of every node id of the CompactGraph, root_id being its own and None for nodes unreachable from root_id."""
+    order = graph.postorder(root_id)
+    index = [-1] * len(graph)
+    for i, node in enumerate(order):
+        index[node] = i
+    idoms = [None] * len(graph)
+    idoms[root_id] = root_id
+    pred_offsets = graph.pred_offsets
+    sources = graph.sources
+
+    def intersect(a, b):
+        while a != b:
+            while index[a] < index[b]:
+                a = idoms[a]
+            while index[b] < index[a]:
+                b = idoms[b]
+        return a
+
+    rpo = order[-2::-1] # root is last in postorder
+    changed = True
+    while changed:
+        changed = False
+        for node in rpo:
+            new_idom = None
+            for pred in sources[pred_offsets[node]:pred_offsets[node + 1]]:
+                if idoms[pred] is not None:
+                    if new_idom is None:
+                        new_idom = pred
+                    else:
+                        new_idom = intersect(pred, new_idom)
+            if idoms[node] != new_idom:
+                idoms[node] = new_idom
+                changed = True
+    return idoms
+
+
+class VirtualNode:
+    """Placeholder node, e.g. the collective end of the graph."""
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+    __repr__ = __str__
+
+
+class DominatorTree:
+    def __init__(self, root, follow_func=follow_following, graph=None):
+        """graph is a CompactGraph taken from root with follow_func, if one is at hand already."""
+        self.root = root
+        if graph is None:
+            graph = CompactGraph.snapshot(root, follow_func)
+        self.set_idoms(graph, 0)
+
+    def set_idoms(self, graph, root_id):
+        nodes = graph.nodes
+        self.idoms = dict((nodes[i], nodes[idom]) for i, idom in enumerate(find_idoms(graph, root_id)) if idom is not None)
+        self.number_tree()
+
+    def number_tree(self):
+        """Numbers the tree in pre- and postorder, making dominance checks constant time."""
+        children = dict((node, set()) for node in self.idoms)
+        for node, idom in self.idoms.items():
+            if node != self.root:
+                children[idom].add(node)
+        self.children = children
+
+        self.enter = {}
+        self.leave = {}
+        counter = 0
+        stack = [(self.root, iter(children[self.root]))]
+        self.enter[self.root] = counter
+        while stack:
+            node, subnodes = stack[-1]
+            for child in subnodes:
+                counter += 1
+                self.enter[child] = counter
+                stack.append((child, iter(children[child])))
+                break
+            else:
+                stack.pop()
+                counter += 1
+                self.leave[node] = counter
+
+    def __contains__(self, node):
+        return node in self.idoms
+
+    def dominates(self, dominator, node):
+        """True if every path from root to node passes through dominator. Every node dominates itself."""
+        if dominator not in self.idoms or node not in self.idoms:
+            return False
+        return self.enter[dominator] <= self.enter[node] and self.leave[node] <= self.leave[dominator]
+
+    def strictly_dominates(self, dominator, node):
+        return dominator != node and self.dominates(dominator, node)
+
+    def get_immediate_dominator(self, node):
+        """Returns the closest strict dominator or None for root and unknown nodes."""
+        if node == self.root or node not in self.idoms:
+            return None
+        return self.idoms[node]
+
+    def get_dominators(self, node):
+        """Returns strict dominators of node, closest first."""
+        dominators = []
+        node = self.get_immediate_dominator(node)
+        while node is not None:
+            dominators.append(node)
+            node = self.get_immediate_dominator(node)
+        return dominators
+
+
+class PostDominatorTree(DominatorTree):
+    """Post-dominators of the graph reachable from head. All nodes without followers are joined in a virtual exit, which is never returned."""
+    def __init__(self, head, follow_func=follow_following):
+        graph = CompactGraph.snapshot(head, follow_func)
+        self.root = VirtualNode('exit')
+        self.set_idoms(graph.reversed(self.root, graph.sinks()), len(graph))
+
+    def get_immediate_dominator(self, node):
+        idom = DominatorTree.get_immediate_dominator(self, node)
+        if idom == self.root:
+            return None
+        return idom
+
+    get_immediate_post_dominator = get_immediate_dominator
+    get_post_dominators = DominatorTree.get_dominators
+    post_dominates = DominatorTree.dominates
@@ -1,111 +1,112 @@
 import pydot
-
-def path_to_edges(path):
-    return [edge for edge in zip(path, path[1:])]
-
-
-class Path:
-    def __init__(self, linklist):
-        """linklist = list of pairs (edge, node).
-        First edge must be None.
-        """
-        if linklist[0][0] is not None:
-            raise ValueError("Malformed linklist")
-        self.linklist = linklist
-    
-    def get_nodes(self):
-        return [link[1] for link in self.linklist]
-
-    def get_edges(self):
-        return [link[0] for link in self.linklist[1:]]
-
-
-def iteredgepaths(graph_head, follow_iter=None):
-    if follow_iter is None:
-        follow_iter = lambda stack: (((stack[-1][1], follow), follow) for follow in stack[-1][1].following)
-    
-    def make_yield(path):
-        return Path(path)
-    
-    def iterator(previous, edge, node):
-        current_path = previous + [(edge, node)]
-        
-        child_present = False
-        for next_edge, next_node in follow_iter(current_path):
-            for path in iterator(current_path, next_edge, next_node):
-                child_present = True
-                yield path
-        
-        if not child_present:
-            yield make_yield(current_path)
-    
-    return iterator([], None, graph_head)
-
-    
-def iterpaths(graph_head, follow_func=None, partial=False, on_backwards=False):
-    if follow_func is None:
-        follow_func = lambda stack: stack[-1].following
-
-    def make_yield(path, forward):
-        if on_backwards:
-            return path, forward
-        return path
-
-    def iterator(previous, node):
-        current_path = previous + [node]
-        if partial:
-            yield make_yield(current_path, True)
-        
-        child_present = False
-        for next in follow_func(current_path):
-            for n in iterator(current_path, next):
-                child_present = True
-                yield n
-                
-        if not child_present and not partial:
-            yield make_yield(current_path, True)
-            if on_backwards:
-                yield make_yield(current_path, False)
-        elif on_backwards and partial:
-            yield make_yield(current_path, False)
-    return iterator([], graph_head)
-
+import dominators
+from compact_graph import CompactGraph, follow_following
 
 def iteredges(graph_head, follow_func=None):
+    """Yields every edge reachable from graph_head once, depth first. follow_func returns (edge, next node) pairs leaving a node."""
     if follow_func is None:
         follow_func = lambda last: (((last, next), next) for next in last.following)
-    
+
     visited = set()
-    def follow(last):
-        for next_edge, next_node in follow_func(last):
+    stack = [iter(follow_func(graph_head))]
+    while stack:
+        for next_edge, next_node in stack[-1]:
             if next_edge not in visited:
-                yield next_edge, next_node
-    
-    def iterator(node):
-        for next_edge, next_node in follow(node):
-            visited.add(next_edge)
-            yield next_edge
-            for e in iterator(next_node):
-                yield e
+                visited.add(next_edge)
+                yield next_edge
+                stack.append(iter(follow_func(next_node)))
+                break
+        else:
+            stack.pop()
+
+
+def dfs_preorder(graph_head, follow_func=follow_following, visited=None):
+    """Yields nodes reachable from graph_head, each before its followers, depth first in the order given by follow_func.
+    Nodes already in visited are skipped. visited is filled in, so sharing it between calls walks a graph with many heads.
+    """
+    if visited is None:
+        visited = set()
+    if graph_head in visited:
+        return
+    visited.add(graph_head)
+    yield graph_head
+    stack = [iter(follow_func(graph_head))]
+    while stack:
+        for node in stack[-1]:
+            if node not in visited:
+                visited.add(node)
+                yield node
+                stack.append(iter(follow_func(node)))
+                break
+        else:
+            stack.pop()
 
-    return iterator(graph_head)
 
+TREE_EDGE = 'tree'
+FORWARD_EDGE = 'forward'
+CROSS_EDGE = 'cross'
+RETREATING_EDGE = 'retreating'
+BACK_EDGE = 'back'
 
-def iternodes(graph_head, follow_func=None):
+
+def classify_edges(graph_head, follow_func=None, find_back_edges=False):
+    """Depth-first edge classification, looking at each edge once.
+    Edges going back to a node still on the stack are retreating. With find_back_edges, those among them whose target dominates their source are told apart as back edges (all of them in reducible graphs). That takes a dominator tree.
+    Returns a dict edge -> kind and a dict node -> reverse postorder number.
+    """
     if follow_func is None:
-        follow_func = lambda stack: stack[-1].following
-    
-    visited = set([graph_head])
-    def follow(stack):
-        for node in follow_func(stack):
-            if node not in visited:
-                visited.add(node) # XXX: is before yield correct?
-                yield node
-    
-    for stack in iterpaths(graph_head, follow_func=follow, partial=True):
-        yield stack[-1]
+        follow_func = lambda node: node.following
+
+    graph = CompactGraph.snapshot(graph_head, follow_func)
+    offsets = graph.offsets
+    targets = graph.targets
+    kinds = {}
+    preorder = [-1] * len(graph)
+    preorder[0] = 0
+    visited_count = 1
+    finished = [False] * len(graph)
+    postorder = []
+    stack = [(0, offsets[0])]
+    while stack:
+        node, position = stack[-1]
+        end = offsets[node + 1]
+        while position < end:
+            next = targets[position]
+            position += 1
+            edge = (node, next)
+            if preorder[next] < 0:
+                kinds.setdefault(edge, TREE_EDGE)
+                preorder[next] = visited_count
+                visited_count += 1
+                stack[-1] = (node, position)
+                stack.append((next, offsets[next]))
+                break
+            if not finished[next]:
+                kind = RETREATING_EDGE
+            elif preorder[next] > preorder[node]:
+                kind = FORWARD_EDGE
+            else:
+                kind = CROSS_EDGE
+            kinds.setdefault(edge, kind)
+        else:
+            stack.pop()
+            finished[node] = True
+            postorder.append(node)
+
+    nodes = graph.nodes
+    kinds = dict(((nodes[source], nodes[target]), kind) for (source, target), kind in kinds.iteritems())
+    retreating = [edge for edge, kind in kinds.items() if kind == RETREATING_EDGE]
+    if find_back_edges and retreating:
+        doms = dominators.DominatorTree(graph_head, graph=graph)
+        for edge in retreating:
+            source, target = edge
+            if doms.dominates(target, source):
+                kinds[edge] = BACK_EDGE
+
+    count = len(postorder)
+    numbers = dict((nodes[node], count - 1 - i) for i, node in enumerate(postorder))
+    return kinds, numbers
 
-cfg_iterator = iternodes
 
 def as_dot(filename, graph_head, marked_nodes=None, marked_edges=None):
     print('printing {0}'.format(filename))
@@ -128,7 +129,7 @@ def as_dot(filename, graph_head, marked_nodes=None, marked_edges=None):
         
     graph = pydot.Dot('name')
     nodes_to_dot = {}
-    for i, node in enumerate(iternodes(graph_head)):
+    for i, node in enumerate(dfs_preorder(graph_head)):
         dotnode = pydot.Node('{0}'.format(i))
         label = '{0}'.format(node)
         dotnode.set_label(label)
@@ -153,7 +154,7 @@ def verify_graph_correct(begin):
     def follow_iter(stack):
         head = stack[-1]
         return head.following + head.preceding
-    for node in iternodes(begin):
+    for node in dfs_preorder(begin):
         for follower in node.following:
             if not node in follower.preceding:
                 raise Exception("{0} links to {1}, but no backlink".format(node, follower))
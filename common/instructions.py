@@ -1,7 +1,33 @@
 import operations
 
 
-class GenericInstruction:
+class Marks(object):
+    """What analyses found out about an instruction. Kept apart from the instruction, so that an InstructionTable can hold on to it while views of the instruction come and go.
+    Marks with a table, a dict, are put there under key on the first change.
+    """
+    __slots__ = ('operation_result', 'used_in', 'replaced_by', 'table', 'key')
+
+    def __init__(self, table=None, key=None):
+        # a little bridge to make an Instruction closer to a small Operation
+        self.operation_result = None
+
+        # get rid of these eventually. replacement will be handled in a structured manner
+        self.used_in = () # addresses of final instructions this one contributed to, a list once there are any
+        self.replaced_by = None # an Operation that completely replaces this instruction
+
+        self.table = table
+        self.key = key
+
+    def keep(self):
+        if self.table is not None:
+            self.table[self.key] = self
+            self.table = None
+
+
+class GenericInstruction(object):
+    """Instructions are numerous, so they keep their attributes in slots. Subclasses must declare theirs too."""
+    __slots__ = ('arch', 'addr', 'address', 'opcode', 'mnemonic', 'operands', 'marks', '__weakref__')
+
     def __init__(self, architecture, address, opcode, mnemonic, operands):
         self.arch = architecture
         self.addr = address
@@ -9,19 +35,47 @@ class GenericInstruction:
         self.opcode = opcode
         self.mnemonic = mnemonic
         self.operands = operands
-
-        # a little bridge to make an Instruction closer to a small Operation
-        self.operation_result = None
-
-        # get rid of these eventually. replacement will be handled in a structured manner
-        self.used_in = [] # list of addresses of final instructions this one contributed to
-        self.replaced_by = None # an Operation that completely replaces this instruction
+        self.marks = Marks()
 
     def addrtoint(self):
         return int(self.addr, 16)
 
+    def keep_marks_in(self, table, key):
+        """Takes marks kept in table under key, or has them put there once they change."""
+        marks = table.get(key)
+        if marks is None:
+            self.marks.table = table
+            self.marks.key = key
+        else:
+            self.marks = marks
+
+    @property
+    def used_in(self):
+        return self.marks.used_in
+
     def mark_chain(self, address):
-        self.used_in.append(address)
+        if not self.marks.used_in:
+            self.marks.used_in = []
+        self.marks.used_in.append(address)
+        self.marks.keep()
+
+    def get_operation_result(self):
+        return self.marks.operation_result
+
+    def set_operation_result(self, value):
+        self.marks.operation_result = value
+        self.marks.keep()
+
+    operation_result = property(get_operation_result, set_operation_result)
+
+    def get_replaced_by(self):
+        return self.marks.replaced_by
+
+    def set_replaced_by(self, operation):
+        self.marks.replaced_by = operation
+        self.marks.keep()
+
+    replaced_by = property(get_replaced_by, set_replaced_by)
 
     def __str__(self):
         ins = ' '.join([self.addr + ':   ', self.mnemonic] + self.operands)
@@ -63,6 +117,43 @@ class GenericInstruction:
         return False
 
 
+class operand_property(object):
+    """Instruction attribute decoded from operands on first access, instead of when the instruction is created. Few attributes of few instructions are ever looked at during flow detection.
+    The value is cached in the slot named like the attribute with a leading underscore, which the class must declare.
+    """
+    def __init__(self, decode):
+        self.decode = decode
+        self.slot = '_' + decode.__name__
+        self.__doc__ = decode.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return getattr(instance, self.slot)
+        except AttributeError:
+            value = self.decode(instance)
+            setattr(instance, self.slot, value)
+            return value
+
+
+def select_instructions(instructions, classify):
+    """Yields instructions whose mnemonic passes classify. Instruction tables build only those instructions."""
+    if hasattr(instructions, 'classify_mnemonics'):
+        for i, selected in enumerate(instructions.classify_mnemonics(classify)):
+            if selected:
+                yield instructions[i]
+    else:
+        for instruction in instructions:
+            if classify(instruction.mnemonic):
+                yield instruction
+
+
+def get_flow_kind(mnemonic, instruction_map, default_class):
+    """Returns the flow kind of instructions with mnemonic, without creating any."""
+    return instruction_map.get(mnemonic, default_class).flow_kind
+
+
 def Instruction(architecture, address, opcode, mnemonic, operands, instruction_map, default_class):
     """Creates instructions based on instruction_map"""
     try:
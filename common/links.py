@@ -0,0 +1,100 @@
+"""Neighbour lists of flow graph nodes, for the following and preceding attributes.
+
+Structuring rewires nodes all the time, replacing one neighbour with another. With plain lists, each removal scans the list, which adds up on nodes joined from many places. Links index the positions of their nodes once there are more than a few, so removal and membership tests take constant time, while order and repeated neighbours stay as in a list.
+"""
+
+import itertools
+
+
+# lists this short are scanned faster than indexed, and most nodes have one or two neighbours
+INDEXED_LENGTH = 8
+EMPTY = object() # slot of a removed node, in indexed links
+
+
+class Links(list):
+    """Nodes in the order they were linked. The same node may be linked more than once, and remove takes away its first occurrence.
+    Short links are plain lists. Longer ones become IndexedLinks.
+    """
+    __slots__ = ('positions', 'length')
+
+    def __init__(self, nodes=()):
+        list.__init__(self, nodes)
+        if list.__len__(self) > INDEXED_LENGTH:
+            IndexedLinks.index(self)
+
+    def append(self, node):
+        list.append(self, node)
+        if list.__len__(self) > INDEXED_LENGTH:
+            IndexedLinks.index(self)
+
+
+class IndexedLinks(Links):
+    """Links with positions of nodes indexed. A removed node leaves an empty slot, and those get squeezed out once they are the majority.
+    Iteration, membership, length, indexing, slicing and comparison see the nodes only. Other list methods are not for use.
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def index(links):
+        """Turns links into IndexedLinks, or squeezes empty slots out of IndexedLinks."""
+        nodes = [node for node in list.__iter__(links) if node is not EMPTY]
+        list.__delslice__(links, 0, list.__len__(links))
+        list.extend(links, nodes)
+        links.positions = {}
+        for position, node in enumerate(nodes):
+            links.positions.setdefault(node, []).append(position)
+        links.length = len(nodes)
+        links.__class__ = IndexedLinks
+
+    def append(self, node):
+        self.positions.setdefault(node, []).append(list.__len__(self))
+        list.append(self, node)
+        self.length += 1
+
+    def remove(self, node):
+        try:
+            positions = self.positions[node]
+        except KeyError:
+            raise ValueError("{0} is not linked".format(node))
+        list.__setitem__(self, positions.pop(0), EMPTY)
+        if not positions:
+            del self.positions[node]
+        self.length -= 1
+        if list.__len__(self) > 2 * self.length + INDEXED_LENGTH:
+            self.index(self)
+
+    def __iter__(self):
+        return (node for node in list.__iter__(self) if node is not EMPTY)
+
+    def __reversed__(self):
+        return (node for node in list.__reversed__(self) if node is not EMPTY)
+
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, node):
+        return node in self.positions
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) or index < 0:
+            return list(self)[index]
+        for node in itertools.islice(self, index, None):
+            return node
+        raise IndexError("Links index out of range")
+
+    def __getslice__(self, start, end):
+        return list(self)[start:end]
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+    __str__ = __repr__
@@ -0,0 +1,25 @@
+class SymbolTable:
+    """Interns names, e.g. of registers, to small integer ids given in order of appearance. Ids can index lists directly."""
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        """Returns the id of name, giving it a new one if it's not known yet."""
+        try:
+            return self.ids[name]
+        except KeyError:
+            symbol_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            return symbol_id
+
+    def get_name(self, symbol_id):
+        return self.names[symbol_id]
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def __len__(self):
+        return len(self.names)
@@ -72,19 +72,9 @@ class ConnectedMessDisplay(LooseMessDisplay):
     def sort_depth_first(self):
         """Sorts the nodes within this subgraph. Depth first within this graph, sorting internals of subgraphs is their responsibility."""
         new_order = []
-        
-        def follow_deeper(display):
-            if display is None:
-                return
-            if display in new_order:
-                return
-            new_order.append(display)
-            followers = self._get_display_followers(display)
-            for follower in followers:
-                follow_deeper(follower)
-        
+        visited = set([None])
         for start in self.get_starting_subdisplays(): # there can be a few starts, so need to do some breadth-first first
-            follow_deeper(start)
+            new_order.extend(graphs.dfs_preorder(start, self._get_display_followers, visited))
         self.insides = new_order
     
     def __str__(self):
@@ -1,33 +1,104 @@
 #!/usr/bin/env python
 
 import sys
+import multiprocessing
 from flow import detect_function, FlowDetectionError
 import memory
+import display
 import argparse
 import parsers
+from parsers import cache as parse_cache
+from parsers import deasm_index
+from parsers import inputs
+from parsers import elf
 
 
 def find_functions(arch, instructions, function_addrs):
+    # one pass over all code, functions only walk the blocks they reach
+    blocks = arch.find_blocks(instructions, instructions.address_index)
     functions = []
     for address in sorted(function_addrs):
         try:
             print('finding function at 0x{0:x}'.format(address))
-            functions.append(detect_function(arch, instructions, address))
+            functions.append(detect_function(arch, instructions, address, instructions.address_index, blocks))
         except FlowDetectionError as e:
             print(e)
     return functions
 
 
+# what --jobs workers need, inherited when the pool forks
+worker_state = None
+
+
+def init_worker(arch, instructions, blocks, function_mapping):
+    global worker_state
+    worker_state = arch, instructions, blocks, function_mapping
+
+
+def detect_function_code(address):
+    """Runs in a worker. Returns the address along with either the function's code or the detection error message.
+    Code is rendered in the worker, because nested graphs are too deeply linked to be sent back.
+    """
+    arch, instructions, blocks, function_mapping = worker_state
+    try:
+        print('finding function at 0x{0:x}'.format(address))
+        function = detect_function(arch, instructions, address, instructions.address_index, blocks)
+    except FlowDetectionError as e:
+        return address, None, str(e)
+    return address, display.function_into_code(function, function_mapping), None
+
+
+def estimate_spans(instructions, function_addrs):
+    """Estimates function sizes as the number of instructions until the next function start."""
+    indices = {}
+    for address in function_addrs:
+        try:
+            indices[address] = instructions.address_index.get_index(address)
+        except KeyError:
+            # outside of the instructions, detection reports it
+            indices[address] = len(instructions)
+    starts = sorted(set(indices.values())) + [len(instructions)]
+    next_starts = dict(zip(starts, starts[1:]))
+    return dict((address, next_starts.get(index, index) - index) for address, index in indices.items())
+
+
+def find_functions_parallel(arch, instructions, function_addrs, function_mapping, jobs):
+    """Detects functions in a pool of jobs processes, biggest first. Returns code of functions in address order."""
+    blocks = arch.find_blocks(instructions, instructions.address_index)
+    spans = estimate_spans(instructions, function_addrs)
+    schedule = sorted(function_addrs, key=lambda address: (-spans[address], address))
+    pool = multiprocessing.Pool(jobs, init_worker, (arch, instructions, blocks, function_mapping))
+    try:
+        results = {}
+        for address, code, error in pool.imap_unordered(detect_function_code, schedule):
+            results[address] = code, error
+    finally:
+        pool.close()
+        pool.join()
+
+    codes = []
+    for address in sorted(function_addrs):
+        code, error = results[address]
+        if error is not None:
+            print(error)
+        else:
+            codes.append(code)
+    return codes
+
+
 if __name__ == '__main__':
     arg_parser = argparse.ArgumentParser(description="Detects control flow in assembly files.")
     arg_parser.add_argument('-m', '--microcode', type=str, choices=['fuc', 'xtensa', 'vp1', 'x86_64'], required=True, help='microcode name')
     arg_parser.add_argument('--cmap', type=str, help='code space map file')
     arg_parser.add_argument('-x', '--no-autodetect', action='store_true', default=False, help="Don't autodetect functions")
-    arg_parser.add_argument('deasm', type=str, help='input deasm file')
+    arg_parser.add_argument('deasm', type=str, help='input deasm file, or ELF file on x86_64')
     arg_parser.add_argument('deco', type=str, help='output decompiled file')
     arg_parser.add_argument('-f', '--function', action="append", help="Function address: decimal (123) or hex (0x12ab)")
+    arg_parser.add_argument('--cache', type=str, help="Directory keeping parsed input files for later runs")
+    arg_parser.add_argument('-j', '--jobs', type=int, default=1, help="Number of processes detecting functions in parallel")
     args = arg_parser.parse_args()
 
+    names_in_deasm = False
     if args.microcode == 'fuc':
         import fuc as arch
         import parsers.envydis as insn_parser
@@ -40,27 +111,57 @@ if __name__ == '__main__':
     elif args.microcode == 'x86_64':
         if args.cmap:
             raise Exception("cmap file not supported on x86_64")
-        if not args.no_autodetect:
-            args.cmap = args.deasm
+        names_in_deasm = not args.no_autodetect
         import arches.x86_64 as arch
         from parsers import objdump as insn_parser
     else:
         raise ValueError("ISA {0} unsupported".format(args.microcode))
     
-    # input file
-    with open(args.deasm) as deasm:
-        data = deasm.readlines()
-
-    instructions = insn_parser.parse_instructions(insn_parser, arch, data)
+    user_addrs = []
+    if args.function:
+        for addr in args.function:
+            if addr.startswith('0x'):
+                addr = int(addr[2:], 16)
+            else:
+                addr = int(addr)
+            user_addrs.append(addr)
 
-    function_mapping = {}
+    cmap_mapping = {}
+    regions = None
     if args.cmap:
-        with open(args.cmap) as cmap:
-            for line in cmap:
-                result = insn_parser.parse_functions_cmap(line.strip())
-                if result:
-                    address, name = result
-                    function_mapping[address] = name
+        with inputs.open_input(args.cmap) as cmap:
+            cmap_mapping, regions = insn_parser.parse_cmap(cmap)
+
+    # input file, parsed line by line unless cached
+    parsed = None
+    deasm_is_elf = args.microcode == 'x86_64' and elf.is_elf(args.deasm)
+    if args.microcode == 'x86_64' and args.no_autodetect and user_addrs and not deasm_is_elf and inputs.get_compression(args.deasm) is None:
+        # only user-provided functions are wanted, the rest of the file can stay unread, unless it's compressed
+        parsed = deasm_index.parse_reachable(arch, args.deasm, user_addrs, args.cache)
+    elif args.cache:
+        objdump_version = elf.get_objdump_version() if deasm_is_elf else ''
+        cache_entry = parse_cache.get_entry_path(args.cache, args.microcode, filter(None, [args.deasm, args.cmap]), objdump_version)
+        parsed = parse_cache.load(cache_entry, arch)
+    if parsed is None:
+        if deasm_is_elf and args.jobs > 1:
+            parsed = elf.parse_elf_parallel(arch, args.deasm, args.jobs)
+        elif deasm_is_elf:
+            parsed = elf.parse_elf(arch, args.deasm)
+        else:
+            with inputs.open_input(args.deasm) as deasm:
+                if args.microcode != 'x86_64':
+                    parsed = insn_parser.parse_instructions(insn_parser, arch, deasm, regions), {}
+                elif args.jobs > 1:
+                    parsed = insn_parser.parse_deasm_parallel(arch, deasm, args.jobs)
+                else:
+                    parsed = insn_parser.parse_deasm(arch, deasm)
+        if args.cache:
+            parse_cache.store(cache_entry, *parsed)
+
+    instructions, function_mapping = parsed
+    if not names_in_deasm:
+        function_mapping = {}
+    function_mapping.update(cmap_mapping)
 
     # find functions in 3 steps
     # step 1: user-provided
@@ -68,23 +169,19 @@ if __name__ == '__main__':
     # step 3: instructions themselves
     # TODO: define rules for overriding
     # TODO. implement as separate steps
-    addrs = function_mapping.keys()
-    if args.function:
-        for addr in args.function:
-            if addr.startswith('0x'):
-                addr = int(addr[2:], 16)
-            else:
-                addr = int(addr)
-            addrs.append(addr)
+    addrs = function_mapping.keys() + user_addrs
     
     function_addrs = set(addrs)
     if not args.no_autodetect:
-        function_addrs.update(arch.find_function_addresses(instructions))
-    functions = find_functions(arch, instructions, function_addrs)
+        function_addrs.update(arch.find_function_addresses(instructions, regions))
+    if args.jobs > 1:
+        code = '\n\n'.join(find_functions_parallel(arch, instructions, function_addrs, function_mapping, args.jobs))
+    else:
+        functions = find_functions(arch, instructions, function_addrs)
     
-    # functions are now basic nested graphs of flow
+        # functions are now basic nested graphs of flow
 
-    code_memory = memory.CodeMemory(functions, function_mapping)
+        code = str(memory.CodeMemory(functions, function_mapping))
 
     with open(args.deco, 'w') as output:
-        output.write(str(code_memory))
+        output.write(code)
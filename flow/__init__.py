@@ -37,7 +37,7 @@ def into_function(address, nested_graph):
     return Function(address, nested_graph.closures)
 
 
-def detect_function(arch, instructions, start_address):
-    flat_graph = arch.detect_flow(instructions, start_address)
+def detect_function(arch, instructions, start_address, address_index=None, blocks=None):
+    flat_graph = arch.detect_flow(instructions, start_address, address_index, blocks)
     nested_graph = structurizer.structurize(flat_graph)
     return into_function(start_address, nested_graph)
@@ -1,4 +1,27 @@
+import array
+import bisect
 from exceptions import *
+from parsers.addresses import AddressIndex
+from common.links import Links
+
+# Kinds of instructions with regard to flow, known from the mnemonic alone
+FLOW_NONE = 0 # never changes flow
+FLOW_JUMP = 1 # jumps, maybe conditionally
+FLOW_BREAK = 2 # exits the function
+FLOW_CALL = 3 # calls a function and comes back
+FLOW_UNKNOWN = 4 # depends on operands, the instruction must be asked
+
+# What single instructions do to flow, as kept in FlowSummary
+FALLTHROUGH = 0
+JUMP = 1
+CONDITIONAL_JUMP = 2
+RETURN = 3 # leaves the function, after delay slots if the architecture has them
+EXIT = 4 # leaves the function at once
+CALL = 5 # calls a function and falls through
+DYNAMIC = 6 # jumps to a target not known before running
+
+NO_TARGET = -1
+
 
 def add_edge(from_, to):
     '''    if to in from_.following:
@@ -33,17 +56,17 @@ class Node:
 class Subflow(Node):
     def __init__(self, instructions):
         self.instructions = instructions
-        self.following = []
-        self.preceding = []
+        self.following = Links()
+        self.preceding = Links()
 
     def copy_before_index(self, index):
         new_flow = Subflow(self.instructions.copy_before(index))
-        new_flow.preceding = self.preceding[:]
+        new_flow.preceding = Links(self.preceding)
         return new_flow
 
     def cut_before_index(self, index):
         self.instructions = self.instructions.copy_after(index)
-        self.preceding = []
+        self.preceding = Links()
 
     def __str__(self):
         return hex(self.instructions.instructions[0].address) + ":" + hex(self.instructions.instructions[-1].address)
@@ -58,8 +81,8 @@ class Subflow(Node):
 
 class StartNode(Node):
     def __init__(self):
-        self.following = []
-        self.preceding = []
+        self.following = Links()
+        self.preceding = Links()
 
     def __str__(self):
         return 'start'
@@ -73,8 +96,8 @@ class StartNode(Node):
 
 class EndNode(Node):
     def __init__(self):
-        self.preceding = []
-        self.following = []
+        self.preceding = Links()
+        self.following = Links()
 
     def __str__(self):
         return 'end'
@@ -85,8 +108,189 @@ class EndNode(Node):
         return neighbors
 
 
-class FlowInstructionMixIn:
-    """Mixin instructions compatible with FunctionFlowEmulator."""
+class SubflowIndex:
+    """Subflows sorted by the instruction ranges they cover. Ranges never overlap."""
+    def __init__(self):
+        self.starts = []
+        self.subflows = []
+
+    def add(self, subflow):
+        start = subflow.instructions.start_index
+        position = bisect.bisect_left(self.starts, start)
+        self.starts.insert(position, start)
+        self.subflows.insert(position, subflow)
+
+    def split(self, presubflow, subflow):
+        """Records subflow being cut in two, presubflow taking over its beginning."""
+        position = bisect.bisect_left(self.starts, presubflow.instructions.start_index)
+        self.subflows[position] = presubflow
+        self.starts.insert(position + 1, subflow.instructions.start_index)
+        self.subflows.insert(position + 1, subflow)
+
+    def find(self, index):
+        """Returns the subflow containing instruction indexed with index, or None."""
+        position = bisect.bisect_right(self.starts, index) - 1
+        if position >= 0:
+            subflow = self.subflows[position]
+            if index < subflow.instructions.end_index:
+                return subflow
+        return None
+
+
+def summarize_at(instructions, address_index, summarize, index):
+    """Returns the flow kind and the target index (or NO_TARGET) of the instruction at index."""
+    kind, target = summarize(instructions[index])
+    if target is None:
+        return kind, NO_TARGET
+    try:
+        return kind, address_index.get_index(target)
+    except KeyError:
+        return kind, NO_TARGET
+
+
+class FlowSummary:
+    """Flow kinds of all instructions and indices of their targets, found once for the whole instruction list. Emulators scan these instead of asking instructions.
+    Instructions without a target, or with a target outside of the instructions, have NO_TARGET.
+    """
+    def __init__(self, instructions, address_index, summarize, indices=None):
+        """summarize returns the kind and the target address (or None) of an instruction. If indices are given, the remaining instructions are taken to fall through."""
+        count = len(instructions)
+        self.kinds = array.array('B', [FALLTHROUGH]) * count
+        self.targets = array.array('l', [NO_TARGET]) * count
+        if indices is None:
+            indices = xrange(count)
+        for i in indices:
+            self.kinds[i], self.targets[i] = summarize_at(instructions, address_index, summarize, i)
+
+    def __len__(self):
+        return len(self.kinds)
+
+
+class LazyFlowSummary:
+    """Same as FlowSummary, but every instruction is summarized when it's first looked up. Finding one function without a BlockTable then looks only at instructions of that function."""
+    def __init__(self, instructions, address_index, summarize):
+        self.instructions = instructions
+        self.address_index = address_index
+        self.summarize = summarize
+        self.found = {}
+        self.kinds = SummaryColumn(self, 0)
+        self.targets = SummaryColumn(self, 1)
+
+    def get(self, index):
+        """Returns the kind and the target index of the instruction at index."""
+        try:
+            return self.found[index]
+        except KeyError:
+            result = self.found[index] = summarize_at(self.instructions, self.address_index, self.summarize, index)
+            return result
+
+    def __len__(self):
+        return len(self.instructions)
+
+
+class SummaryColumn:
+    """Kinds or targets of a LazyFlowSummary, indexed like the arrays of FlowSummary."""
+    def __init__(self, summary, field):
+        self.summary = summary
+        self.field = field
+
+    def __getitem__(self, index):
+        return self.summary.get(index)[self.field]
+
+    def __len__(self):
+        return len(self.summary)
+
+
+class BlockTable:
+    """Basic blocks of the whole instruction list, shared by all functions.
+    Leaders are indices where flow may start or join, stops are indices of instructions which may change flow. Emulators can skip over anything in between.
+    summary is the FlowSummary the blocks were found from.
+    """
+    def __init__(self, leaders, stops, count, summary):
+        self.leaders = sorted(set(leader for leader in leaders if leader < count))
+        self.stops = sorted(set(stops))
+        self.count = count
+        self.summary = summary
+
+    def __len__(self):
+        return len(self.leaders)
+
+    def get_end(self, index):
+        """Returns the last index reachable from index without passing a stop or reaching a leader."""
+        position = bisect.bisect_right(self.leaders, index)
+        if position < len(self.leaders):
+            end = self.leaders[position] - 1
+        else:
+            end = self.count - 1
+        position = bisect.bisect_left(self.stops, index)
+        if position < len(self.stops):
+            end = min(end, self.stops[position])
+        return end
+
+    def iterblocks(self):
+        """Yields (first, last) index pairs of blocks."""
+        for start, next in zip(self.leaders, self.leaders[1:] + [self.count]):
+            yield start, next - 1
+
+
+def find_flow_kinds(instructions):
+    """Returns flow kinds of all instructions. Instruction tables find them from mnemonics, without creating instructions."""
+    if hasattr(instructions, 'get_flow_kinds'):
+        return instructions.get_flow_kinds()
+    return [instruction.flow_kind for instruction in instructions]
+
+
+def summarize_instruction(instruction):
+    """Returns the flow kind and target address of an instruction with the interface of FlowInstructionMixIn."""
+    if instruction.jumps():
+        target = instruction.target
+        if not (isinstance(target, int) or isinstance(target, long)):
+            return DYNAMIC, None
+        if instruction.is_conditional():
+            return CONDITIONAL_JUMP, target
+        return JUMP, target
+    elif instruction.breaks_function():
+        return RETURN, None
+    elif instruction.calls_function():
+        target = instruction.function
+        if not (isinstance(target, int) or isinstance(target, long)):
+            target = None
+        return CALL, target
+    return FALLTHROUGH, None
+
+
+def find_flow_summary(instructions, address_index):
+    """Summarizes instructions with the interface of FlowInstructionMixIn. Only those which may change flow are looked at."""
+    indices = [i for i, kind in enumerate(find_flow_kinds(instructions)) if kind != FLOW_NONE]
+    return FlowSummary(instructions, address_index, summarize_instruction, indices)
+
+
+def find_blocks(instructions, address_index=None):
+    """Marks jump targets, fall-throughs and returns in a single pass. Works with instructions with the interface of FlowInstructionMixIn."""
+    if address_index is None:
+        address_index = AddressIndex(instruction.address for instruction in instructions)
+    summary = find_flow_summary(instructions, address_index)
+    leaders = [0]
+    stops = []
+    for i, kind in enumerate(summary.kinds):
+        if kind == JUMP or kind == CONDITIONAL_JUMP or kind == DYNAMIC:
+            stops.append(i)
+            leaders.append(i + 1)
+            if summary.targets[i] != NO_TARGET:
+                leaders.append(summary.targets[i])
+        elif kind == RETURN:
+            stops.append(i)
+            leaders.append(i + 1)
+    return BlockTable(leaders, stops, len(instructions), summary)
+
+
+class FlowInstructionMixIn(object):
+    """Mixin instructions compatible with FunctionFlowEmulator.
+    flow_kind must agree with the methods for every instruction of the class, or be FLOW_UNKNOWN.
+    """
+    __slots__ = ()
+    flow_kind = FLOW_UNKNOWN
+
     def jumps(self):
         """Returns True if jumps. If it does, must define address."""
         return False
@@ -122,43 +326,74 @@ class FunctionFlowEmulator:
     """
     """Chosen: store subflows normally, separate following (splits) and preceding (joins) flows, make no exception for "straight" flow.
     """
-    def __init__(self, instructions, start_address):
+    def __init__(self, instructions, start_address, address_index=None, blocks=None):
+        """address_index should come from the parser, otherwise it's built from scratch.
+        blocks is the BlockTable of all instructions. Without it, emulation goes one instruction at a time, summarizing instructions as it meets them.
+        """
+        if address_index is None:
+            address_index = AddressIndex(instruction.address for instruction in instructions)
         self.instructions = instructions
+        self.address_index = address_index
+        self.blocks = blocks
+        if blocks is None:
+            self.summary = self.find_summary()
+        else:
+            self.summary = blocks.summary
         self.flow = StartNode()
         self._end = EndNode()
-        self.find(self.get_index(start_address))
+        self.subflows = SubflowIndex()
+        self.entry_index = self.get_index(start_address)
+        self.find(self.entry_index)
 
     def get_index(self, address):
-        for i, instr in enumerate(self.instructions):
-            if instr.address == address:
-                return i
-        raise FunctionBoundsException("Address 0x{0:x} out of this code block.".format(address))
+        try:
+            return self.address_index.get_index(address)
+        except KeyError:
+            raise FunctionBoundsException("Address 0x{0:x} out of this code block.".format(address))
+
+    def find_summary(self):
+        return LazyFlowSummary(self.instructions, self.address_index, summarize_instruction)
+
+    def get_target_index(self, index):
+        """Returns the index of the target of the jump at index."""
+        target = self.summary.targets[index]
+        if target == NO_TARGET:
+            # fails for targets outside of the instructions
+            return self.get_index(self.instructions[index].target)
+        return target
+
+    def get_run_end(self, index):
+        """Returns the last index which emulation starting at index can reach without meeting anything that matters for flow."""
+        if self.blocks is None:
+            return index
+        end = self.blocks.get_end(index)
+        # function entry is a leader only for this function
+        if index < self.entry_index <= end:
+            end = self.entry_index - 1
+        return end
 
     def find_existing_subflow(self, index):
-        """BFS over the whole graph to find the subflow node containing instruction indexed with index."""
-        nodes = [self.flow]
-        traversed_nodes = set()
-        while nodes:
-            new_nodes = []
-            for node in nodes:
-                if not isinstance(node, StartNode) and not isinstance(node, EndNode):
-                    if node.instructions.start_index <= index < node.instructions.end_index:
-                        return node
-                if not isinstance(node, EndNode):
-                    followers = frozenset(node.following).difference(traversed_nodes)
-                    traversed_nodes.update(followers)
-                    new_nodes.extend(list(followers))
-            nodes = new_nodes
-        return None
+        """Finds the subflow node containing instruction indexed with index."""
+        return self.subflows.find(index)
 
     def find(self, start_index):
-        self.find_subflow(self.flow, start_index)
+        """Works through pending branches last-in first-out, which visits code in the same order as following each branch recursively would."""
+        self.pending = [(self.flow, start_index)]
+        while self.pending:
+            source, index = self.pending.pop()
+            self.find_subflow(source, index)
+
+    def queue_subflows(self, source, *indices):
+        """Schedules flows starting at indices to be found after source. The first index gets followed first."""
+        for index in reversed(indices):
+            self.pending.append((source, index))
 
     def commit_flow(self, source_node, start_index, end_index):
         """Adds executed instructions to the graph."""
         instructions = Instructions(self.instructions[start_index:end_index + 1], start_index, end_index + 1)
         subflow = Subflow(instructions)
         add_edge(source_node, subflow)
+        self.subflows.add(subflow)
         return subflow
 
     def find_subflow(self, source, start_index):
@@ -178,6 +413,7 @@ class FunctionFlowEmulator:
                     preceding.following.remove(subflow)
                     preceding.following.append(presubflow)
                 subflow.cut_before_index(start_index)
+                self.subflows.split(presubflow, subflow)
                 add_edge(presubflow, subflow)
                     
      #           print 'rips it apart, results:', presubflow, subflow
@@ -189,7 +425,7 @@ class FunctionFlowEmulator:
             add_edge(source, subflow)
       
     def follow_subflow(self, source_node, index):
-        """Actual emulation: follows instruction stream starting with index. Should call commit_flow to save results and recursively find_subflow for each discontinuity.
+        """Actual emulation: follows instruction stream starting with index. Should call commit_flow to save results and queue_subflows for each discontinuity.
         """
         raise NotImplementedError
 
@@ -201,26 +437,23 @@ class SimpleEmulator(FunctionFlowEmulator):
     #    print 'starting emulation after {0}'.format(source)
         current_index = index
 
-        # for instruction in self.instructions indexed by current_index:
-        for instruction in self.instructions[current_index:]:
-            if instruction.jumps():
-   #             print 'leaving 0x{0:x} from 0x{1:x}'.format(self.instructions[current_index].address, instruction.address)
-                if not (isinstance(instruction.target, int) or isinstance(instruction.target, long)):
-                    raise EmulationUnsupported("Function can't be traced, contains a dynamic jump at 0x{0:x}.".format(instruction.address))
-                if instruction.is_conditional():
-                    subflow = self.commit_flow(source, index, current_index)
-                    self.find_subflow(subflow, current_index + 1)
-  #                  print 'again from', hex(instruction.address)
-                    self.find_subflow(subflow, self.get_index(instruction.target))
-                    return
-                else:
-                    subflow = self.commit_flow(source, index, current_index)
-                    self.find_subflow(subflow, self.get_index(instruction.target))
-                    return
-            elif instruction.breaks_function():
+        kinds = self.summary.kinds
+        while current_index < len(self.instructions):
+            current_index = self.get_run_end(current_index)
+            kind = kinds[current_index]
+            if kind == DYNAMIC:
+                raise EmulationUnsupported("Function can't be traced, contains a dynamic jump at 0x{0:x}.".format(self.instructions[current_index].address))
+            elif kind == CONDITIONAL_JUMP:
+                subflow = self.commit_flow(source, index, current_index)
+                self.queue_subflows(subflow, current_index + 1, self.get_target_index(current_index))
+                return
+            elif kind == JUMP:
+                subflow = self.commit_flow(source, index, current_index)
+                self.queue_subflows(subflow, self.get_target_index(current_index))
+                return
+            elif kind == RETURN:
                 subflow = self.commit_flow(source, index, current_index)
                 add_edge(subflow, self._end)
- #               print subflow, 'is *FINISH*ed'
                 return
             
             post_subflow = self.find_existing_subflow(current_index + 1)
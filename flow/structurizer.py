@@ -1,5 +1,8 @@
 from common.closures import *
 from common.graphs import *
+from common.dominators import PostDominatorTree, VirtualNode
+from common.cycle_equivalence import CycleEquivalence
+from common.links import Links
 
 import functools
 
@@ -80,6 +83,84 @@ def ordered_prev_node(node, reverse_edges):
 ordered_prev = ordered_prev_node
 
 
+class EdgeEquivalence:
+    """Ordered edges grouped by cycle equivalence, each group in dominance order.
+    In the ordered graph, with a virtual entry leading to all ordered sources, edges of a group are exactly those which pre-dominate the later ones and post-dominate the earlier ones. Groups are cycle equivalence classes, found in one pass, and root is the tree of regions they bound.
+    """
+    def __init__(self, graph_head, reverse_edges):
+        self.reverse_edges = reverse_edges
+        nodes = list(dfs_preorder(graph_head))
+        entry = VirtualNode('entry')
+        sources = [node for node in nodes if not any(True for link in ordered_prev_link(node, reverse_edges))]
+
+        def follow(node):
+            if node is entry:
+                return [((entry, source), source) for source in sources]
+            links = []
+            for edge, next in ordered_next_link(node, reverse_edges):
+                if (edge, next) not in links:
+                    links.append((edge, next))
+            return links
+
+        equivalence = CycleEquivalence(entry, follow)
+        self.root = equivalence.root
+        self.groups = {}
+        self.positions = {}
+        for edge_ids in equivalence.members:
+            group = [equivalence.edges[edge_id] for edge_id in edge_ids]
+            group = [edge for edge in group if edge is not None and edge[0] is not entry]
+            for position, edge in enumerate(group):
+                self.groups[edge] = group
+                self.positions[edge] = position
+
+    def get_farthest_equivalent(self, edge):
+        """Returns the last edge which edge pre-dominates and which post-dominates edge, or edge itself."""
+        if edge not in self.groups:
+            return edge
+        group = self.groups[edge]
+        # collapsed edges stay in groups until they get in the way
+        while self.groups.get(group[-1]) is not group:
+            group.pop()
+        return group[-1]
+
+    def collapse(self, region, start, end, mess):
+        """Updates the groups for region between start and end getting replaced by mess. Call before rewiring.
+        Equivalence of edges outside stays the same as long as the region is only entered into start and left from end, along forward edges. Returns False if that's not the case and the groups must be rebuilt.
+        Takes time proportional to the size of the region, not of the groups.
+        """
+        removed = []
+        renamed = {}
+        for node in region:
+            for following in node.following:
+                edge = (node, following)
+                if following in region:
+                    removed.append(edge)
+                elif node is end and edge not in self.reverse_edges:
+                    renamed[edge] = (mess, following)
+                else:
+                    return False
+            for preceding in node.preceding:
+                edge = (preceding, node)
+                if preceding in region:
+                    continue
+                elif node is start and edge not in self.reverse_edges:
+                    renamed[edge] = (preceding, mess)
+                else:
+                    return False
+
+        for edge in removed:
+            self.groups.pop(edge, None)
+            self.positions.pop(edge, None)
+        for old, new in renamed.items():
+            group = self.groups.pop(old, None)
+            if group is not None:
+                position = self.positions.pop(old)
+                group[position] = new
+                self.groups[new] = group
+                self.positions[new] = position
+        return True
+
+
 def structurize_mess(mess, reverse_paths):
     wrapper = MessStructurizer(mess, reverse_paths)
     wrapper.print_dot('raw_mess.dot', marked_edges=[reverse_paths])
@@ -95,23 +176,40 @@ class MessStructurizer:
         self.mess_closure = mess_closure
         self.reverse_edges = reverse_edges
         self.bananas = None
+        self.edge_equivalence = None
     
     def wrap_largest_bananas(self):
         """Wraps all bananas that can be potentially found, but starts with largest. They won't be structured at first.
+        Bananas come from one walk over the tree of regions in the ordered graph. Those nested in a banana are left for when the banana gets structured, with reverse edges of its own.
         """
         bananas = []
-        while True:
-            new_banana = self.find_wrap_banana()
-            print(new_banana)
-            if new_banana is None:
-                break
-            bananas.append(new_banana)
-            self.print_dot('banana_swallowed.dot', marked_edges=    [self.reverse_edges])
+        wrapped = set()
+        self.edge_equivalence = EdgeEquivalence(self.mess_closure.begin, self.reverse_edges)
+        stack = [iter(self.edge_equivalence.root.children)]
+        while stack:
+            for region in stack[-1]:
+                if region.entry[0] in wrapped or region.entry[1] in wrapped:
+                    continue
+                bounds = self.find_banana_bounds(region.entry)
+                if bounds is None:
+                    stack.append(iter(region.children))
+                    break
+                new_banana = self.wrap(*bounds)
+                print(new_banana)
+                bananas.append(new_banana)
+                wrapped.update(new_banana.closures)
+                self.print_dot('banana_swallowed.dot', marked_edges=[self.reverse_edges])
+                if self.edge_equivalence is None:
+                    # the tree doesn't tell about the new graph, walk a new one
+                    self.edge_equivalence = EdgeEquivalence(self.mess_closure.begin, self.reverse_edges)
+                    stack = [iter(self.edge_equivalence.root.children)]
+                    break
+            else:
+                stack.pop()
         self.bananas = bananas
-    
-    def find_wrap_banana(self):
-        """
-        Wraps the first banana it can find. Needs to restart the search every time anew because the graph gets restructured significantly.
+
+    def find_banana_bounds(self, edge):
+        """Returns the first and the last node of the largest banana entered through edge, or None if there's none.
         Follow links in "ordered" fashion - in this way find pairs of most distant edges that dominate each other and wrap them in bananas.
         This will wrap forward flows as well as reverse flows.
             Strategy for cutting off: include start node, if node does not split; include end node if node is not joined from elsewhere.
@@ -123,120 +221,59 @@ class MessStructurizer:
         
         FIXME: strategy for reducing shortlinks
         """
-        def follow_func(stack):
-            return ordered_next(stack[-1], self.reverse_edges)
-        
-        def follow_edge_func(last):
-            return ordered_next_edge(last, self.reverse_edges)
-
-        def follow_rev(stack):
-            return ordered_prev(stack[-1], self.reverse_edges)
-
         # XXX: exclude self from pre-dominators
         # XXX: self-loops?
 
-        # find all pre-dominators and post-dominators
+        # group edges which pre- and post-dominate each other
         # XXX: they should be found according to normal flow direction... or something, to reduce simple >A->B< links
-        
-        def follow_link_iter(stack):
-            edge, node = stack[-1]
-            return ordered_next_link(node, self.reverse_edges)
-            
-        def follow_rev_link_iter(stack):
-            edge, node = stack[-1]
-            return ordered_prev_link(node, self.reverse_edges)
-                
-        edges_to_predoms = {}
-        edges_to_postdoms = {}
-        for edge in iteredges(self.mess_closure.begin):
-            if edge in self.reverse_edges:
-                last, first = edge
-            else:
-                first, last = edge
-                
-            edges_to_postdoms[edge] = find_ordered_dominator_edges(last, follow_link_iter)
-            edges_to_predoms[edge] = find_ordered_dominator_edges(first, follow_rev_link_iter)
-            
-        def get_both_dominator(edge):
-            """Returns the farthest edge which dominates edge if it is dominated by edge.
-            """
-            edge_dominators = edges_to_postdoms[edge]
-            # if edge has no post-dominators then it is its own dominator and only node dominated by itself
-            if not edge_dominators:
-                return edge
-            
-            # start searching from the fathest one
-            for postdom in reversed(edge_dominators):
-                # if is dominated by edge, then we found it
-                if edge in edges_to_predoms[postdom]:
-                    return postdom
-            
-            # if no dominator of edge is also dominated by edge, then edge is the only such dominator
-            return edge
-            
-        def wrap(start, end):
-            """Wraps nodes (and whatever is between them) together in a future banana. Rewires accordingly,
-            """
-     #       FCUK: update reverse edges after each rewiring
-            print('Farthest node that is predomed by {0} is {1}, need to wrap'.format(start, end))
-            mess = wrap_between(start, end, self.reverse_edges)
-            # sinle entry and single exit guaranteed
-            if not mess.begin == start:
-                raise Exception("Something went wrong.")
-            if not mess.end == end:
-                raise Exception("Something went wrong.")
-            
-            for preceding in start.preceding[:]:
-                if preceding not in mess.closures:
-                    preceding.replace_following(start, mess)
-            
-            for following in end.following[:]:
-                if following not in mess.closures:
-                    following.replace_preceding(end, mess)
-            self.mess_closure.replace_closures(mess.closures, mess)
-            print("wrapped {0} inside {1}".format(mess, self.mess_closure))
-            return mess
-            
-        print("reverse", self.reverse_edges)
-        print("begin", self.mess_closure.begin)
-        print("predoms", edges_to_predoms)
-        print("postdoms", edges_to_postdoms)
-        
-        for edge in iteredges(self.mess_closure.begin,
-                              follow_func=follow_edge_func):
-            print("E", edge)
-            # find lowest edge for which top is dominator
-            both_dominator = get_both_dominator(edge)
-            print("BD", both_dominator)
-#            nodes_between = find_nodes(edge, both_dominator)
-            # find all nodes in between
-            # remove the top node if it splits
-            # XXX: handle the top node if it joins from lower
-            # similar rules for bottom
-            if edge not in self.reverse_edges:
-                print("fw")
-                source, target = edge
-                end_source, end_target = both_dominator
-            else:
-                print("rev")
-                # do the same thing, but pay attention to order
-                source, target = both_dominator
-                end_source, end_target = edge
-                
-#            if len(source.following) != 1:
-            if True:
-                start = target
-            else:
-                start = source
-            
-#            if len(end_target.preceding) != 1:
-            if True:
-                end = end_source
-            else:
-                end = end_target
-            if start != end and not (end, start) == edge:
-                return wrap(start, end)
+        print("E", edge)
+        # find lowest edge for which top is dominator
+        both_dominator = self.edge_equivalence.get_farthest_equivalent(edge)
+        print("BD", both_dominator)
+        # find all nodes in between
+        # remove the top node if it splits
+        # XXX: handle the top node if it joins from lower
+        # similar rules for bottom
+        if edge not in self.reverse_edges:
+            print("fw")
+            source, target = edge
+            end_source, end_target = both_dominator
+        else:
+            print("rev")
+            # do the same thing, but pay attention to order
+            source, target = both_dominator
+            end_source, end_target = edge
+
+        start = target
+        end = end_source
+        if start != end and not (end, start) == edge:
+            return start, end
         return None
+
+    def wrap(self, start, end):
+        """Wraps nodes (and whatever is between them) together in a future banana. Rewires accordingly. Edge equivalence groups are kept up to date, or dropped if the wrap changes them beyond that.
+        """
+ #       FCUK: update reverse edges after each rewiring
+        print('Farthest node that is predomed by {0} is {1}, need to wrap'.format(start, end))
+        mess = wrap_between(start, end, self.reverse_edges)
+        # sinle entry and single exit guaranteed
+        if not mess.begin == start:
+            raise Exception("Something went wrong.")
+        if not mess.end == end:
+            raise Exception("Something went wrong.")
+
+        if not self.edge_equivalence.collapse(mess.closures, start, end, mess):
+            self.edge_equivalence = None
+        for preceding in start.preceding[:]:
+            if preceding not in mess.closures:
+                preceding.replace_following(start, mess)
+
+        for following in end.following[:]:
+            if following not in mess.closures:
+                following.replace_preceding(end, mess)
+        self.mess_closure.replace_closures(mess.closures, mess)
+        print("wrapped {0} inside {1}".format(mess, self.mess_closure))
+        return mess
         
     def merge_straightlinks(self):
         return self.mess_closure.reduce_straightlinks()
@@ -262,6 +299,7 @@ class BaseBananaStructurizer:
             raise RuntimeError("No reverse edges data")
         self.subs = []
         current = self.graph_head
+        self.postdoms = None
         while True:
             # first follow forward trivial chains
             while True:
@@ -275,7 +313,10 @@ class BaseBananaStructurizer:
                 break
             
             # not end node, and not a trivial chain may proceed
-            dom = find_earliest_post_dominator(current, self.reverse_edges)
+            # wrapping only rewires nodes before dom, so the tree stays valid for everything after it
+            if self.postdoms is None:
+                self.postdoms = PostDominatorTree(current, self.ordered_next)
+            dom = self.postdoms.get_immediate_post_dominator(current)
             
             if dom is None:
                 raise ValueError("Post-dominator not found for {0}".format(current))
@@ -296,8 +337,8 @@ class BaseBananaStructurizer:
                         
             else:
                 # XXX
-                current.following = [subgraph]
-                subgraph.preceding = [current]
+                current.following = Links([subgraph])
+                subgraph.preceding = Links([current])
             
             if dom is subgraph.end:
                 for following in dom.following[:]:
@@ -308,8 +349,8 @@ class BaseBananaStructurizer:
                         raise Exception("A node initiating a subflow should only be reachable from inside the subflow.")
             else:
                 # XXX
-                dom.preceding = [subgraph]
-                subgraph.following = [dom]
+                dom.preceding = Links([subgraph])
+                subgraph.following = Links([dom])
                 
             if self.graph_head in subgraph.closures:
                 self.graph_head = subgraph
@@ -320,6 +361,9 @@ class BaseBananaStructurizer:
             
             self.subs.append(subgraph)
             self.print_dot('dropped_{0}.dot'.format(len(self.subs)))
+            if dom in subgraph.closures:
+                # dom was swallowed, paths starting from it changed
+                self.postdoms = None
             current = dom
             
     def pack_banana(self):
@@ -382,8 +426,8 @@ class GraphWrapper(BaseBananaStructurizer): # necessarily a bananawrapper
         class GhostClosure(NodeClosure):
             def __init__(self, original):
                 Closure.__init__(self, None)
-                self.preceding = original.preceding[:]
-                self.following = original.following[:]
+                self.preceding = Links(original.preceding)
+                self.following = Links(original.following)
                 # XXX: this is so ugly I want to cry
                 import flow.emulator
                 self.node = flow.emulator.Subflow(flow.emulator.Instructions([], original.node.instructions.start_index, original.node.instructions.end_index))
@@ -392,8 +436,8 @@ class GraphWrapper(BaseBananaStructurizer): # necessarily a bananawrapper
             def insert(self):
                 """Inserts ghost before its original"""
                 original = self.original
-                self.following = [original]
-                original.preceding = [self]
+                self.following = Links([original])
+                original.preceding = Links([self])
                 for preceding in self.preceding:
                     preceding.following.remove(original)
                     preceding.following.append(self)
@@ -413,7 +457,7 @@ class GraphWrapper(BaseBananaStructurizer): # necessarily a bananawrapper
             __repr__ = __str__
         
         multijoiners = set()
-        for node in iternodes(self.graph_head):
+        for node in dfs_preorder(self.graph_head):
             if len(node.preceding) > 1 and len(node.following) > 1:
                 multijoiners.add(node)
         
@@ -432,11 +476,11 @@ class GraphWrapper(BaseBananaStructurizer): # necessarily a bananawrapper
         
     def wrap_graph(self, graph_head):
         node_to_closure = {}
-        for node in cfg_iterator(graph_head):
+        for node in dfs_preorder(graph_head):
             closure = NodeClosure(node)
             node_to_closure[node] = closure
             
-        for node in cfg_iterator(graph_head):
+        for node in dfs_preorder(graph_head):
             closure = node_to_closure[node]
             for preceding in node.preceding:
                 closure.preceding.append(node_to_closure[preceding])
@@ -447,48 +491,29 @@ class GraphWrapper(BaseBananaStructurizer): # necessarily a bananawrapper
         
         
 def find_reverse_edges(graph_head, graph_tail):
-    reverse_edges = set()
-    
-    def follow_func(stack):
-        top = stack[-1]
-        for next in top.following:
-            if not (top, next) in reverse_edges:
-                yield next
-    
-    for path, forward in iterpaths(graph_head,
-                                   follow_func=follow_func,
-                                   partial=True,
-                                   on_backwards=True):
-                          
-        top = path[-1]
-        if forward:
-            # when moving into depth, check paths along the way to stop before traversing them
-            for next in top.following:
-                if next in path:
-                    reverse_edges.add((top, next))
-        else:
-            # when coming back after traversing all child nodes, check the kind of an edge
-            # if all following edges are reverse direction, then this one is also.
-            if top.following and \
-               top is not graph_tail and \
-               all(((top, next) in reverse_edges) for next in top.following):
-                # top node MUST have a parent, since there must be a split to reverse mode before it
-                # XXX: I really hope that's true
-                top_parent = path[-2]
-                reverse_edges.add((top_parent, top))
+    """Returns the set of reverse edges."""
+    kinds, numbers = classify_edges(graph_head)
+    reverse_edges = set(edge for edge, kind in kinds.items()
+                        if kind == RETREATING_EDGE)
+
+    incoming = {}
+    for edge in kinds:
+        incoming.setdefault(edge[1], []).append(edge)
+
+    # if all following edges are reverse direction, then the ones leading in are also.
+    # In postorder all non-reverse followers are decided before the node itself.
+    for node in sorted(numbers, key=numbers.__getitem__, reverse=True):
+        if node.following and \
+           node is not graph_tail and \
+           all(((node, next) in reverse_edges) for next in node.following):
+            # node MUST have a parent, since there must be a split to reverse mode before it
+            reverse_edges.update(incoming.get(node, ()))
     return reverse_edges
 
 
 def find_earliest_post_dominator(node, reverse_edges):
-    def follow_func(stack):
-        return ordered_next(stack[-1], reverse_edges)
-        
-    doms = find_post_dominators(node, follow_func)
-
-    if doms:
-        return doms[0]
-    else:
-        return None
+    postdoms = PostDominatorTree(node, lambda n: ordered_next(n, reverse_edges))
+    return postdoms.get_immediate_post_dominator(node)
 
 
 def find_latest_post_dominator(node, follow_func):
@@ -501,99 +526,84 @@ def find_latest_post_dominator(node, follow_func):
 
 
 def find_unordered_dominators(node, follow_func):
-    doms = None
-    for path in iterpaths(node, follow_func=follow_func):
-        if doms is None:
-            doms = set(path[1:]) # remove self
-        else:
-            doms.intersection_update(path)
-    return doms
-
-
-def find_unordered_dominator_edges(node, follow_iter):
-    doms = None
-    for path in iteredgepaths(node, follow_iter=follow_iter):
-        edges = path.get_edges()
-        if doms is None:
-            doms = set(edges)
-        else:
-            doms.intersection_update(edges)
-    return doms
-
+    return set(find_post_dominators(node, follow_func))
 
-def find_ordered_dominator_edges(node, follow_iter):
-    doms = find_unordered_dominator_edges(node, follow_iter)
-    path = iteredgepaths(node, follow_iter=follow_iter).next()
 
-    return list(filter(doms.__contains__, path.get_edges()))
+def find_post_dominators(node, follow_func):
+    """Returns nodes present on all paths from node, in path order. follow_func only gets to see the top of the stack."""
+    postdoms = PostDominatorTree(node, lambda n: follow_func([n]))
+    return postdoms.get_post_dominators(node)
+
+
+def find_region(start, end, reverse_edges):
+    """Walks all ordered paths from start at once. Paths stop at end or where flow ends.
+    Returns the nodes on them, that is everything reachable from start without going through end, mapped to their ordered predecessors on the paths. Also returns the nodes where paths stop.
+    """
+    if start is end:
+        raise ValueError("The shortest flow should have separate start and end nodes, got {0}.".format(start))
+
+    predecessors = {start: []}
+    last_nodes = set()
+    pending = [start]
+    while pending:
+        node = pending.pop()
+        if node is end:
+            last_nodes.add(node)
+            continue
+        is_last = True
+        for next in ordered_next(node, reverse_edges):
+            is_last = False
+            if next in predecessors:
+                predecessors[next].append(node)
+            else:
+                predecessors[next] = [node]
+                pending.append(next)
+        if is_last:
+            last_nodes.add(node)
+    return predecessors, last_nodes
 
 
-def find_post_dominators(node, follow_func):
-    doms = find_unordered_dominators(node, follow_func)
-    path = iterpaths(node, follow_func=follow_func).next()
-
-    dom_list = []
-    for child in path:
-        if child in doms:
-            dom_list.append(child)
-    return dom_list
-    
 def wrap_between(start, end, reverse_edges):
     print 'wrap', start, end
-    def follow_func(stack):
-        if stack[-1] is end:
-            return ()
-        else:
-            return ordered_next(stack[-1], reverse_edges)
-
-    contents = set()
-    for path in iterpaths(start, follow_func=follow_func):
-        print path
-        if len(path) < 2:
-            raise Exception
-        contents.update(set(path))
-    return LooseMess(contents, set([start]), set([end]))
+    predecessors, last_nodes = find_region(start, end, reverse_edges)
+    return LooseMess(set(predecessors), set([start]), set([end]))
 
 
 def find_mess(start, end, reverse_edges):
     #TODO: cut start/end connections
     # determine if starts with split or looplike join
     # XXX: make sure outer loop layers are peeled if joins from nested loops
-    start_index = None
-    if not any((preceding, start) in reverse_edges for preceding in start.preceding): # if not loop-join
-        start_index = 1
+    # if not loop-join
+    keep_start = any((preceding, start) in reverse_edges for preceding in start.preceding)
     
     # determine if end is a join or a looplike split
-    end_index = None
-    if not any((end, following) in reverse_edges for following in end.following): # not loop-split
-        end_index = -1    
+    # not loop-split
+    keep_end = any((end, following) in reverse_edges for following in end.following)
         
     # find all nodes in between
-    
-    def follow_func(stack):
-        if stack[-1] is end:
-            return ()
-        else:
-            return ordered_next(stack[-1], reverse_edges)
-    
-    contents = set()
-    start_nodes = set()
-    end_nodes = set()
-    for path in iterpaths(start, follow_func=follow_func):
-        if len(path) < 2:
-            raise Exception("Not sure why. The shortest flow should have separate start and end nodes.")
-            
-        path = path[start_index:end_index]
-        if len(path):
-            snode = path[0]
-            enode = path[-1]
-        else:
-            snode = None
-            enode = None
-            
-        start_nodes.add(snode)
-        end_nodes.add(enode)
-        contents.update(set(path))
+    predecessors, last_nodes = find_region(start, end, reverse_edges)
+    contents = set(predecessors)
+    if not keep_start:
+        contents.remove(start)
+    if not keep_end:
+        contents.difference_update(last_nodes)
+
+    # entries and exits of the region come from edges crossing its boundary, None stands for a straight link from start to end
+    if keep_start:
+        start_nodes = set([start])
+    else:
+        start_nodes = set()
+        for next in ordered_next(start, reverse_edges):
+            start_nodes.add(next if next in contents else None)
+
+    if keep_end:
+        end_nodes = last_nodes
+    else:
+        end_nodes = set()
+        for last_node in last_nodes:
+            for node in predecessors[last_node]:
+                end_nodes.add(node if node in contents else None)
+
     print('mess contents', contents)
     return LooseMess(contents, start_nodes, end_nodes)
 
@@ -9,9 +9,18 @@ def parse_size(operand):
     raise ValueError("Unrecognized size: " + operand)
 
 
+def is_register(operand):
+    return operand.startswith('$')
+
+
+def parse_reg(operand):
+    """Returns the register id."""
+    return machine.registers.intern(operand)
+
+
 def parse_reg_or_imm(operand):
-    if operand.startswith('$'):
-        return operand
+    if is_register(operand):
+        return parse_reg(operand)
     else:
         return parse_imm(operand)
 
@@ -38,11 +47,16 @@ def parse_address(addr):
 
 
 class FucInstruction(instructions.GenericInstruction, flow.emulator.FlowInstructionMixIn):
+    __slots__ = ()
+
     def calls_function(self):
         raise NotImplementedError
 
 
 class SimpleInstruction(FucInstruction):
+    __slots__ = ()
+    flow_kind = flow.emulator.FLOW_NONE
+
     def jumps(self):
         return False
     
@@ -54,13 +68,18 @@ class SimpleInstruction(FucInstruction):
 
 
 class BRAInstruction(FucInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        FucInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.target = parse_imm(operands[-1])
-        if len(operands) == 1:
-            self.condition = ''
-        else:
-            self.condition = parse_imm(operands[0])
+    __slots__ = ('_target', '_condition')
+    flow_kind = flow.emulator.FLOW_JUMP
+
+    @instructions.operand_property
+    def target(self):
+        return parse_imm(self.operands[-1])
+
+    @instructions.operand_property
+    def condition(self):
+        if len(self.operands) == 1:
+            return ''
+        return parse_imm(self.operands[0])
 
     def jumps(self):
         return True
@@ -76,9 +95,12 @@ class BRAInstruction(FucInstruction):
 
 
 class CALLInstruction(FucInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        FucInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.function = parse_imm(operands[0])
+    __slots__ = ('_function',)
+    flow_kind = flow.emulator.FLOW_CALL
+
+    @instructions.operand_property
+    def function(self):
+        return parse_imm(self.operands[0])
 
     def jumps(self):
         return False
@@ -91,6 +113,9 @@ class CALLInstruction(FucInstruction):
 
 
 class RETInstruction(FucInstruction):
+    __slots__ = ()
+    flow_kind = flow.emulator.FLOW_BREAK
+
     def jumps(self):
         return False
 
@@ -101,47 +126,62 @@ class RETInstruction(FucInstruction):
         return False
 
 
-class LDInstruction(SimpleInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        SimpleInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.size = parse_size(operands[0])
-        self.destination = operands[1]
-        
-        base, offset = parse_address(operands[2])
+class MemoryInstruction(SimpleInstruction):
+    """Loads and stores. The address operand is [base+offset] or [base]."""
+    __slots__ = ('_size', '_base', '_offset')
+    address_operand = None
+
+    @instructions.operand_property
+    def size(self):
+        return parse_size(self.operands[0])
+
+    @instructions.operand_property
+    def base(self):
+        base, offset = parse_address(self.operands[self.address_operand])
         if not (base.startswith('$r') or base.startswith('$sp')):
-            raise Exception('unsupported base ' + base + ' of ' + GenericInstruction.__str__(self))
-        else:
-            self.base = base
-        
-        self.offset = parse_reg_or_imm(offset)
+            raise Exception('unsupported base ' + base + ' of ' + instructions.GenericInstruction.__str__(self))
+        return parse_reg(base)
+
+    @instructions.operand_property
+    def offset(self):
+        base, offset = parse_address(self.operands[self.address_operand])
+        return parse_reg_or_imm(offset)
+
+    @property
+    def offset_in_register(self):
+        base, offset = parse_address(self.operands[self.address_operand])
+        return is_register(offset)
+
+
+class LDInstruction(MemoryInstruction):
+    __slots__ = ('_destination',)
+    address_operand = 2
+
+    @instructions.operand_property
+    def destination(self):
+        return parse_reg(self.operands[1])
 
     def evaluate(self, machine_state):
         offset = self.offset
-        if not isinstance(self.offset, int):
+        if self.offset_in_register:
             offset = machine_state.read_register(self.offset)
         base = machine_state.read_register(self.base)
         value = machine_state.read_memory(base, offset, self.size)
         machine_state.write_register(self.destination, value)
 
 
-class STInstruction(SimpleInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        SimpleInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.size = parse_size(operands[0])
-        self.source = operands[2]
-        
-        base, offset = parse_address(operands[1])
-        if not (base.startswith('$r') or base.startswith('$sp')):
-            raise Exception('unsupported base ' + base + ' of ' + GenericInstruction.__str__(self))
-        else:
-            self.base = base
-        
-        self.offset = parse_reg_or_imm(offset)
+class STInstruction(MemoryInstruction):
+    __slots__ = ('_source',)
+    address_operand = 1
+
+    @instructions.operand_property
+    def source(self):
+        return parse_reg(self.operands[2])
 
     def evaluate(self, machine_state):
         source = machine_state.read_register(self.source)
         offset = self.offset
-        if not isinstance(self.offset, int):
+        if self.offset_in_register:
             offset = machine_state.read_register(self.offset)
         base = machine_state.read_register(self.base)
         machine_state.write_memory(base, offset, self.size, source)
@@ -151,13 +191,18 @@ class STInstruction(SimpleInstruction):
 
 
 class MOVInstruction(SimpleInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        SimpleInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.source = parse_reg_or_imm(operands[1])
-        self.destination = operands[0]
+    __slots__ = ('_source', '_destination')
+
+    @instructions.operand_property
+    def source(self):
+        return parse_reg_or_imm(self.operands[1])
+
+    @instructions.operand_property
+    def destination(self):
+        return parse_reg(self.operands[0])
 
     def evaluate(self, machine_state):
-        if not isinstance(self.source, int):
+        if is_register(self.operands[1]):
             value = machine_state.read_register(self.source)
         else:
             value = self.source
@@ -165,10 +210,15 @@ class MOVInstruction(SimpleInstruction):
 
 
 class CLEARInstruction(SimpleInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        SimpleInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.size = operands[0]
-        self.destination = operands[1]
+    __slots__ = ('_destination',)
+
+    @property
+    def size(self):
+        return self.operands[0]
+
+    @instructions.operand_property
+    def destination(self):
+        return parse_reg(self.operands[1])
 
     def evaluate(self, machine_state):
         if self.size == 'b32':
@@ -183,26 +233,39 @@ class CLEARInstruction(SimpleInstruction):
 
 
 class ANDInstruction(SimpleInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        SimpleInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.destination = operands[0]
-        self.source1 = operands[-2]
-        self.source2 = parse_reg_or_imm(operands[-1])
+    __slots__ = ('_destination', '_source1', '_source2')
+
+    @instructions.operand_property
+    def destination(self):
+        return parse_reg(self.operands[0])
+
+    @instructions.operand_property
+    def source1(self):
+        return parse_reg(self.operands[-2])
+
+    @instructions.operand_property
+    def source2(self):
+        return parse_reg_or_imm(self.operands[-1])
 
     def evaluate(self, machine_state):
         s1 = machine_state.read_register(self.source1)
-        if isinstance(self.source2, int):
-            s2 = self.source2
-        else:
+        if is_register(self.operands[-1]):
             s2 = machine_state.read_register(self.source2)
+        else:
+            s2 = self.source2
         machine_state.write_register(self.destination, s1 & s2)
 
 
 class SETHIInstruction(SimpleInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        SimpleInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.destination = operands[0]
-        self.source = parse_imm(operands[1])
+    __slots__ = ('_destination', '_source')
+
+    @instructions.operand_property
+    def destination(self):
+        return parse_reg(self.operands[0])
+
+    @instructions.operand_property
+    def source(self):
+        return parse_imm(self.operands[1])
 
     def evaluate(self, machine_state):
         value = machine_state.read_register(self.destination)
@@ -223,3 +286,7 @@ instruction_map = {'ld': LDInstruction,
 
 def Instruction(address, opcode, mnemonic, operands):
     return instructions.Instruction(machine.Architecture, address, opcode, mnemonic, operands, instruction_map, SimpleInstruction)
+
+
+def flow_kind(mnemonic):
+    return instructions.get_flow_kind(mnemonic, instruction_map, SimpleInstruction)
@@ -1,17 +1,32 @@
 import memory
 import values
+from common.symbols import SymbolTable
+
+
+# general purpose registers come first, their ids are their numbers
+GP_REGISTER_COUNT = 16
+registers = SymbolTable(['$r' + str(num) for num in range(GP_REGISTER_COUNT)])
 
 
 class Registers:
-    REGISTERS = ['$r' + str(num) for num in range(16)]
+    """Values of registers, indexed by register ids. Parsing interns registers other than general purpose ones too, e.g. special ones, so there's room for every id in registers."""
     def __init__(self):
-        self.gp = [values.UnknownValue(reg_name) for reg_name in self.REGISTERS]
+        self.contents = []
+        self.add_unknown()
     
-    def get(self, name):
-        return self.gp[int(name[2:])]
+    def add_unknown(self):
+        """Makes room for registers interned after the last call. Their values are unknown."""
+        self.contents.extend(values.UnknownValue(registers.get_name(reg_id)) for reg_id in range(len(self.contents), len(registers)))
+
+    def get(self, reg_id):
+        if reg_id >= len(self.contents):
+            self.add_unknown()
+        return self.contents[reg_id]
 
-    def set(self, name, value):
-        self.gp[int(name[2:])] = value
+    def set(self, reg_id, value):
+        if reg_id >= len(self.contents):
+            self.add_unknown()
+        self.contents[reg_id] = value
 
 
 class MachineState:
@@ -95,5 +110,6 @@ class MemoryStructure:
 
 
 class Architecture:
+    registers = registers
     DummyMachineState = DummyMachineState
     MachineState = MachineState
\ No newline at end of file
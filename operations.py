@@ -1,19 +1,21 @@
 import values
 
-def traceback_register(context, reg_spec):
+def traceback_register(context, reg_id):
+    """Finds the value of the register with reg_id, as seen by the instruction at index."""
     instructions, index, memory = context
+    reg_name = instructions[index].arch.registers.get_name(reg_id)
     index = index - 1 
     while index >= 0:
         try:
             instruction = instructions[index]
-            if reg_spec in instruction.get_modified_regs():
-                return instruction.get_result_value((instructions, index, memory), reg_spec)
+            if reg_id in instruction.get_modified_regs():
+                return instruction.get_result_value((instructions, index, memory), reg_id)
 
             index -= 1
         except NotImplementedError:
             print instruction.mnemonic, 'is not supported yet'
-            return values.UnknownValue(reg_spec)
-    return values.UnknownValue(reg_spec)
+            return values.UnknownValue(reg_name)
+    return values.UnknownValue(reg_name)
 
 
 class Registers:
@@ -55,7 +57,7 @@ class MemoryAssignment:
     def traceback(self):
         self.base = traceback_register((self.instructions, self.index, self.data_SRAM), self.instruction.base)
 
-        if not isinstance(self.instruction.offset, int):
+        if self.instruction.offset_in_register:
             self.offset = traceback_register((self.instructions, self.index, self.data_SRAM), self.instruction.offset)
         
         size = self.get_memory_size()
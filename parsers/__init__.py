@@ -1,4 +1,6 @@
 from parsers.common import *
+import collections
+import multiprocessing
 import re
 
 # TODO: implement as objects to utilize inheritance
@@ -6,21 +8,31 @@ import re
 class objdump:
     function_header = re.compile('^(?P<address>[a-f0-9]*) ' + re.escape('<') + '(?P<name>.+)' + re.escape('>: ') + '*$')
     """Compatible with -Mintel"""
+    PARALLEL_BACKLOG = 2 # chunks read ahead per worker process
     
     @classmethod
     def parse_deasm(cls, arch, lines):
-        instructions = []
+        """Reads instructions and function names in one pass. lines can be any iterable, e.g. an open file."""
+        instructions = InstructionTable(arch)
         function_mapping = {}
         
         for line in lines:
             line = line.strip('\n')
             if line:
                 if line.lstrip() != line:
-                    instructions.append(cls.parse_instruction(arch, line))
+                    if line.strip() == '...':
+                        # zeroes left out by objdump
+                        continue
+                    addr, opcode, mnemonic, operands = cls.split_instruction(line)
+                    if mnemonic:
+                        instructions.append(addr, opcode, mnemonic, operands)
+                    elif len(instructions):
+                        # opcode too long for one line
+                        instructions.extend_opcode(opcode)
                 elif re.match(cls.function_header, line):
                     addr, name = cls.parse_functions_cmap(line)
                     if addr in function_mapping:
-                        raise ValueError('Function at 0x{0:x} with name {0} already defined as {1}'.format(addr, function_mapping[addr], name))
+                        raise ValueError('Function at 0x{0:x} with name {1} already defined as {2}'.format(addr, name, function_mapping[addr]))
                     function_mapping[addr] = name
                 else:
                     # some comment...
@@ -28,15 +40,72 @@ class objdump:
         return instructions, function_mapping
     
     @classmethod
-    def parse_instructions(cls, arch, lines):
+    def parse_deasm_parallel(cls, arch, lines, jobs, chunk_size=100000):
+        """Same as parse_deasm, but chunks of about chunk_size lines are parsed in jobs processes. Chunks are cut at function headers.
+        At most PARALLEL_BACKLOG chunks per process are read ahead, so a big disassembly is never held in memory as a whole.
+        """
+        pool = multiprocessing.Pool(jobs)
+        try:
+            return cls.merge_parsed(arch, cls.map_bounded(pool, parse_objdump_chunk, cls.split_chunks(lines, chunk_size), jobs * cls.PARALLEL_BACKLOG))
+        finally:
+            pool.close()
+            pool.join()
+
+    @staticmethod
+    def map_bounded(pool, func, items, window):
+        """Yields func(item) for every item, in order, computed in pool. Only window items are taken from items before their results are consumed."""
+        pending = collections.deque()
+        for item in items:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= window:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    @staticmethod
+    def merge_parsed(arch, parsed):
+        """Joins results of parse_deasm on consecutive parts of a disassembly."""
+        instructions = InstructionTable(arch)
+        function_mapping = {}
+        for part_instructions, part_mapping in parsed:
+            instructions.extend(part_instructions)
+            for addr, name in part_mapping.items():
+                if addr in function_mapping:
+                    raise ValueError('Function at 0x{0:x} with name {1} already defined as {2}'.format(addr, name, function_mapping[addr]))
+                function_mapping[addr] = name
+        return instructions, function_mapping
+
+    @classmethod
+    def split_chunks(cls, lines, chunk_size):
+        """Groups lines into lists of at least chunk_size lines, each but the first starting with a function header."""
+        chunk = []
+        for line in lines:
+            if len(chunk) >= chunk_size and re.match(cls.function_header, line.strip('\n')):
+                yield chunk
+                chunk = []
+            chunk.append(line)
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def parse_instructions(parser, arch, lines):
+        """Same calling convention as parsers.common.parse_instructions."""
         # TODO: deprecated, deasm file will contain more than instructions
-        return cls.parse_deasm(arch, lines)[0]
+        return parser.parse_deasm(arch, lines)[0]
+
+    @classmethod
+    def parse_instruction(cls, arch, disasmline):
+        addr, opcode, mnemonic, operands = cls.split_instruction(disasmline)
+        if not mnemonic:
+            raise ParsingError("line {0!r} continues an opcode, it's not an instruction".format(disasmline))
+        return arch.Instruction(addr, opcode, mnemonic, operands)
 
     @staticmethod
-    def parse_instruction(arch, disasmline):
-        """Format:
+    def split_instruction(disasmline):
+        """Returns arguments of arch.Instruction. Format:
         1234:   56 78 90      mnemonic dest,src
         addr:   op co de      mnemonic destination,source
+        Lines continuing the opcode of the previous one have an empty mnemonic.
         """
         addr, rest = disasmline.split(':', 1)
         try:
@@ -62,7 +131,7 @@ class objdump:
             operands = spl[1].strip().split(',')
         else:
             operands = []
-        return arch.Instruction(addr, opcode, mnemonic, operands)
+        return addr, opcode, mnemonic, operands
         
     @classmethod
     def parse_functions_cmap(cls, cmapline):
@@ -70,3 +139,8 @@ class objdump:
         if matches:
             addr, name = matches.groupdict()['address'], matches.groupdict()['name']
             return int(addr, 16), name
+
+
+def parse_objdump_chunk(lines):
+    """Runs in a worker process. Instructions come back as arrays and get their arch when merged."""
+    return objdump.parse_deasm(None, lines)
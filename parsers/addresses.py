@@ -0,0 +1,13 @@
+class AddressIndex:
+    """Maps instruction addresses to their positions in an instruction list. Filled in while parsing, never changes afterwards."""
+    def __init__(self, addresses=()):
+        self._indices = {}
+        for i, address in enumerate(addresses):
+            self.add(address, i)
+
+    def add(self, address, index):
+        self._indices.setdefault(address, index)
+
+    def get_index(self, address):
+        """Raises KeyError for addresses outside of the list."""
+        return self._indices[address]
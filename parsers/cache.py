@@ -0,0 +1,137 @@
+"""On-disk cache of parsed deasm files.
+Entries are keyed by input contents, ISA, PARSER_VERSION and the version of objdump disassembling ELF input, so that any change to them gives a miss instead of stale data.
+An entry is a header followed by raw arrays of the InstructionTable and the function names. They're read straight into arrays, without any text parsing.
+"""
+
+import array
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from parsers.common import InstructionTable, PARSER_VERSION
+from parsers.addresses import AddressIndex
+
+
+MAGIC = 'EDECACHE'
+ALIGNMENT = 8
+TABLE_ARRAYS = ['addresses', 'addr_format_ids', 'opcode_offsets', 'mnemonic_ids', 'operand_ids', 'operand_offsets']
+# typecodes of table arrays, opcodes, string pool, function addresses and names
+SECTION_TYPECODES = 'LILIIL' + 'B' + 'BL' + 'L' + 'BL'
+
+
+def hash_file(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), ''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_entry_path(directory, isa, paths, tool_version=''):
+    """Returns the cache file for parsing files at paths, e.g. a deasm and the cmap deciding what gets dropped.
+    tool_version names the disassembler producing the parsed text, if it's not in the files. Array layouts differ between machines, so they are part of the key.
+    """
+    key = [hash_file(path) for path in paths] + [isa, str(PARSER_VERSION), tool_version, sys.byteorder]
+    key.extend(str(array.array(typecode).itemsize) for typecode in 'IL')
+    return os.path.join(directory, hashlib.sha1('\0'.join(key)).hexdigest() + '.cache')
+
+
+def pack_strings(strings):
+    """Returns strings as one blob and an array of their end offsets in it."""
+    ends = array.array('L')
+    end = 0
+    for string in strings:
+        end += len(string)
+        ends.append(end)
+    return array.array('B', ''.join(strings)), ends
+
+
+def unpack_strings(blob, ends):
+    blob = blob.tostring()
+    strings = []
+    start = 0
+    for end in ends:
+        strings.append(blob[start:end])
+        start = end
+    return strings
+
+
+def store(entry_path, instructions, function_mapping):
+    """Writes parse results. The file appears at once, so concurrent runs never read it half-written."""
+    function_addresses = array.array('L', sorted(function_mapping))
+    # None is stored as an empty name, names are never empty
+    names = [function_mapping[address] or '' for address in function_addresses]
+    sections = [getattr(instructions, name) for name in TABLE_ARRAYS]
+    sections.append(array.array('B', str(instructions.opcodes)))
+    sections.extend(pack_strings(instructions.strings))
+    sections.append(function_addresses)
+    sections.extend(pack_strings(names))
+
+    header = MAGIC + struct.pack('<I', len(sections))
+    for section in sections:
+        header += struct.pack('<cQ', section.typecode, len(section))
+
+    directory = os.path.dirname(entry_path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, temp_path = tempfile.mkstemp(dir=directory or '.')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(header)
+        for section in sections:
+            f.write('\0' * (-f.tell() % ALIGNMENT))
+            section.tofile(f)
+    os.rename(temp_path, entry_path)
+
+
+def load(entry_path, arch):
+    """Returns instructions and function mapping, or None if there's no usable entry."""
+    try:
+        f = open(entry_path, 'rb')
+    except IOError:
+        return None
+    with f:
+        try:
+            sections = read_sections(f)
+        except (struct.error, ValueError, EOFError, IOError):
+            sections = None
+    if sections is None:
+        return None
+
+    instructions = InstructionTable(arch)
+    for name in TABLE_ARRAYS:
+        setattr(instructions, name, sections.pop(0))
+    instructions.opcodes = bytearray(sections.pop(0).tostring())
+    instructions.strings = unpack_strings(sections.pop(0), sections.pop(0))
+    instructions.string_ids = dict((string, i) for i, string in enumerate(instructions.strings))
+    instructions.address_index = AddressIndex(instructions.addresses)
+
+    function_addresses = sections.pop(0)
+    names = unpack_strings(sections.pop(0), sections.pop(0))
+    function_mapping = dict((address, name or None) for address, name in zip(function_addresses, names))
+    return instructions, function_mapping
+
+
+def read_sections(f):
+    """Returns arrays stored in the file, or None if they aren't laid out as SECTION_TYPECODES."""
+    if f.read(len(MAGIC)) != MAGIC:
+        return None
+    count, = struct.unpack('<I', f.read(4))
+    if count != len(SECTION_TYPECODES):
+        return None
+    entry_size = struct.calcsize('<cQ')
+    layout = [struct.unpack('<cQ', f.read(entry_size)) for i in range(count)]
+    if ''.join(typecode for typecode, length in layout) != SECTION_TYPECODES:
+        return None
+
+    # arrays can't be backed by a mapping, so sections get copied either way. fromfile copies once, while mmap slices went through a string first.
+    size = os.fstat(f.fileno()).st_size
+    sections = []
+    for typecode, length in layout:
+        f.seek(-f.tell() % ALIGNMENT, os.SEEK_CUR)
+        section = array.array(typecode)
+        if f.tell() + length * section.itemsize > size:
+            return None
+        section.fromfile(f, length)
+        sections.append(section)
+    return sections
@@ -1,14 +1,203 @@
+import array
+import bisect
+import weakref
+from parsers.addresses import AddressIndex
+
+
+# bump whenever parsers start giving different results, so that cached parses get dropped
+PARSER_VERSION = 1
+
+
+CODE_REGION = 'code'
+DATA_REGION = 'data'
+
+
 class ParsingError(ValueError): pass
 
 
-def parse_instructions(parser, arch, lines):
+class RegionMap:
+    """Data address ranges, e.g. tables in a code space map. Every address outside of them is code."""
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def add_data(self, start, end=None):
+        """Marks addresses from start up to end, exclusive, as data. Without end, all addresses from start on are data. Overlapping ranges are merged."""
+        position = bisect.bisect_right(self.starts, start)
+        if position > 0 and (self.ends[position - 1] is None or self.ends[position - 1] >= start):
+            position -= 1
+            start = self.starts[position]
+        last = position
+        while last < len(self.starts) and (end is None or self.starts[last] <= end):
+            if self.ends[last] is None or (end is not None and self.ends[last] > end):
+                end = self.ends[last]
+            last += 1
+        self.starts[position:last] = [start]
+        self.ends[position:last] = [end]
+
+    def get_kind(self, address):
+        position = bisect.bisect_right(self.starts, address) - 1
+        if position < 0:
+            return CODE_REGION
+        end = self.ends[position]
+        if end is not None and address >= end:
+            return CODE_REGION
+        return DATA_REGION
+
+    def is_data(self, address):
+        return self.get_kind(address) == DATA_REGION
+
+
+def make_addr_format(addr, address):
+    """Returns a format string rebuilding addr text from the address, or addr itself if it's too odd."""
+    digits = addr.strip()
+    start = addr.index(digits)
+    addr_format = addr[:start] + '{0:0' + str(len(digits)) + 'x}' + addr[start + len(digits):]
+    if addr_format.format(address) != addr:
+        return addr
+    return addr_format
+
+
+class InstructionTable:
+    """Read-only sequence of parsed instructions, kept in flat arrays rather than as one object each.
+    Strings (address formats, mnemonics, operands) are pooled and referred to by ids. Opcodes share one buffer.
+    Instruction objects are views built by arch.Instruction on access. A view stays the same object while anything holds it, and is built anew afterwards. Marks of views, like used_in, stay in the table once set.
+    address_index indexes instruction addresses.
+    """
+    def __init__(self, arch):
+        self.arch = arch
+        self.addresses = array.array('L')
+        self.addr_format_ids = array.array('I')
+        self.opcodes = bytearray()
+        self.opcode_offsets = array.array('L', [0])
+        self.mnemonic_ids = array.array('I')
+        self.operand_ids = array.array('I')
+        self.operand_offsets = array.array('L', [0])
+        self.strings = []
+        self.string_ids = {}
+        self.address_index = AddressIndex()
+        self.views = weakref.WeakValueDictionary()
+        self.marks = {}
+
+    def get_string_id(self, string):
+        try:
+            return self.string_ids[string]
+        except KeyError:
+            string_id = self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+            return string_id
+
+    def append(self, addr, opcode, mnemonic, operands):
+        """Stores an instruction given as arguments of arch.Instruction."""
+        address = int(addr, 16)
+        self.address_index.add(address, len(self.addresses))
+        self.addresses.append(address)
+        self.addr_format_ids.append(self.get_string_id(make_addr_format(addr, address)))
+        self.opcodes.extend(opcode)
+        self.opcode_offsets.append(len(self.opcodes))
+        self.mnemonic_ids.append(self.get_string_id(mnemonic))
+        self.operand_ids.extend(self.get_string_id(operand) for operand in operands)
+        self.operand_offsets.append(len(self.operand_ids))
+
+    def extend_opcode(self, opcode):
+        """Appends bytes to the opcode of the last instruction."""
+        self.opcodes.extend(opcode)
+        self.opcode_offsets[-1] = len(self.opcodes)
+
+    def extend(self, other):
+        """Appends all instructions of another table."""
+        string_ids = [self.get_string_id(string) for string in other.strings]
+        first = len(self.addresses)
+        for i, address in enumerate(other.addresses):
+            self.address_index.add(address, first + i)
+        self.addresses.extend(other.addresses)
+        self.addr_format_ids.extend(string_ids[i] for i in other.addr_format_ids)
+        opcodes_start = len(self.opcodes)
+        self.opcodes.extend(other.opcodes)
+        self.opcode_offsets.extend(opcodes_start + offset for offset in other.opcode_offsets[1:])
+        self.mnemonic_ids.extend(string_ids[i] for i in other.mnemonic_ids)
+        operands_start = len(self.operand_ids)
+        self.operand_ids.extend(string_ids[i] for i in other.operand_ids)
+        self.operand_offsets.extend(operands_start + offset for offset in other.operand_offsets[1:])
+
+    def __getstate__(self):
+        """Only the arrays and strings are pickled. Unpickled tables have no arch nor address_index and are only good for merging with extend."""
+        state = self.__dict__.copy()
+        del state['arch']
+        del state['string_ids']
+        del state['address_index']
+        del state['views']
+        del state['marks']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.arch = None
+        self.string_ids = dict((string, i) for i, string in enumerate(self.strings))
+        self.address_index = None
+        self.views = weakref.WeakValueDictionary()
+        self.marks = {}
+
+    def get_fields(self, index):
+        """Returns arguments of arch.Instruction for the instruction at index."""
+        strings = self.strings
+        address = self.addresses[index]
+        addr = strings[self.addr_format_ids[index]].format(address)
+        opcode = tuple(self.opcodes[self.opcode_offsets[index]:self.opcode_offsets[index + 1]])
+        mnemonic = strings[self.mnemonic_ids[index]]
+        operands = [strings[i] for i in self.operand_ids[self.operand_offsets[index]:self.operand_offsets[index + 1]]]
+        return addr, opcode, mnemonic, operands
+
+    def classify_mnemonics(self, classify):
+        """Returns classify(mnemonic) of every instruction. classify is called once per distinct mnemonic."""
+        results = dict((mnemonic_id, classify(self.strings[mnemonic_id])) for mnemonic_id in set(self.mnemonic_ids))
+        return [results[mnemonic_id] for mnemonic_id in self.mnemonic_ids]
+
+    def get_flow_kinds(self):
+        """Returns flow kinds of all instructions, as given by arch.flow_kind."""
+        return array.array('B', self.classify_mnemonics(self.arch.flow_kind))
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('instruction index out of range')
+        instruction = self.views.get(index)
+        if instruction is None:
+            instruction = self.arch.Instruction(*self.get_fields(index))
+            instruction.keep_marks_in(self.marks, index)
+            self.views[index] = instruction
+        return instruction
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+
+def in_data(regions, line):
+    """Checks the address of an instruction line without parsing the rest of it."""
+    try:
+        return regions.is_data(int(line[:line.index(':')], 16))
+    except ValueError:
+        return False
+
+
+def parse_instructions(parser, arch, lines, regions=None):
+    """lines can be any iterable, e.g. an open file. Instructions in data regions are dropped."""
     # filter out instructions and parse them
-    instructions = []
+    instructions = InstructionTable(arch)
     for line in lines:
         line = line.strip()
         if not line.startswith('//') and not line == '' and not line.startswith('['):
+            if regions is not None and in_data(regions, line):
+                continue
             try:
-                instructions.append(parser.parse_line(arch, line))
+                instructions.append(*parser.split_line(line))
             except ParsingError, e:
                 #print e, 'line skipped'
                 pass
@@ -0,0 +1,113 @@
+"""Parses only the parts of an objdump file reachable from chosen functions.
+Function headers split the file into byte ranges. Their index can be kept in the cache directory, valid while the file keeps its path, size and modification time.
+"""
+
+import bisect
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+from parsers import objdump
+from parsers.common import InstructionTable
+from flow.emulator import find_flow_kinds, FLOW_JUMP, FLOW_UNKNOWN
+
+
+INDEX_SUFFIX = '.fidx'
+
+function_headers = re.compile(objdump.function_header.pattern, re.M)
+
+
+def find_function_ranges(data):
+    """Returns (address, start offset, end offset) of every function in file order. Anything before the first header is a range at address 0."""
+    starts = [(int(match.group('address'), 16), match.start()) for match in function_headers.finditer(data)]
+    if not starts or starts[0][1] > 0:
+        starts.insert(0, (0, 0))
+    ends = [start for address, start in starts[1:]] + [len(data)]
+    return [(address, start, end) for (address, start), end in zip(starts, ends)]
+
+
+def get_index_path(directory, path):
+    """Returns the index file for the deasm at path. Hashing contents would mean reading the whole file, so the index is keyed by the path."""
+    return os.path.join(directory, hashlib.sha1(os.path.abspath(path)).hexdigest() + INDEX_SUFFIX)
+
+
+def load_function_ranges(path, data, cache_dir=None):
+    """Reads function ranges from the index in cache_dir, rebuilding it if it's missing or stale. Without cache_dir, ranges are always found anew."""
+    if cache_dir is None:
+        return find_function_ranges(data)
+
+    stat = os.stat(path)
+    stamp = '{0} {1!r}'.format(stat.st_size, stat.st_mtime)
+    index_path = get_index_path(cache_dir, path)
+    try:
+        with open(index_path) as index:
+            if index.readline().strip() == stamp:
+                return [tuple(int(field, 16) for field in line.split()) for line in index]
+    except (IOError, ValueError):
+        pass
+
+    ranges = find_function_ranges(data)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, 'w') as index:
+            index.write(stamp + '\n')
+            for function_range in ranges:
+                index.write('{0:x} {1:x} {2:x}\n'.format(*function_range))
+        os.rename(temp_path, index_path)
+    except (IOError, OSError):
+        pass # unwritable cache, index is not kept
+    return ranges
+
+
+def falls_through(instruction):
+    if instruction.jumps():
+        return instruction.is_conditional()
+    return not instruction.breaks_function()
+
+
+def parse_reachable(arch, path, addresses, cache_dir=None):
+    """Same results as objdump.parse_deasm, limited to functions that flow from addresses can reach by jumps or falling through.
+    cache_dir is where the index of functions in the file is kept.
+    Parsed functions keep their file order, so falling through the end of one always reaches the next.
+    """
+    with open(path, 'rb') as deasm:
+        data = mmap.mmap(deasm.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        ranges = load_function_ranges(path, data, cache_dir)
+        by_address = sorted((address, position) for position, (address, start, end) in enumerate(ranges))
+        range_addresses = [address for address, position in by_address]
+
+        def find_range(address):
+            i = bisect.bisect_right(range_addresses, address) - 1
+            if i < 0:
+                return None
+            return by_address[i][1]
+
+        parsed = {}
+        pending = [find_range(address) for address in addresses]
+        while pending:
+            position = pending.pop()
+            if position is None or position in parsed:
+                continue
+            address, start, end = ranges[position]
+            instructions, function_mapping = objdump.parse_deasm(arch, data[start:end].splitlines())
+            parsed[position] = instructions, function_mapping
+            for i, kind in enumerate(find_flow_kinds(instructions)):
+                if kind == FLOW_JUMP or kind == FLOW_UNKNOWN:
+                    instruction = instructions[i]
+                    if instruction.jumps() and isinstance(instruction.target, (int, long)):
+                        pending.append(find_range(instruction.target))
+            if len(instructions) and falls_through(instructions[-1]) and position + 1 < len(ranges):
+                pending.append(position + 1)
+    finally:
+        data.close()
+
+    instructions = InstructionTable(arch)
+    function_mapping = {}
+    for position in sorted(parsed):
+        instructions.extend(parsed[position][0])
+        function_mapping.update(parsed[position][1])
+    return instructions, function_mapping
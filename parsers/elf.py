@@ -0,0 +1,78 @@
+"""Disassembly of ELF files by objdump, parsed while objdump still runs, without an intermediate deasm file."""
+
+import multiprocessing
+import subprocess
+from parsers import objdump
+
+
+ELF_MAGIC = '\x7fELF'
+# same as tests/convert.py uses
+OBJDUMP = ['objdump', '-Mintel', '-d']
+
+
+def is_elf(path):
+    with open(path, 'rb') as f:
+        return f.read(len(ELF_MAGIC)) == ELF_MAGIC
+
+
+class ObjdumpOutput:
+    """Lines of objdump output on the file at path, as they come. objdump failing is an IOError on leaving the with block."""
+    def __init__(self, path, options=()):
+        self.path = path
+        self.process = subprocess.Popen(OBJDUMP + list(options) + [path], stdout=subprocess.PIPE)
+
+    def __iter__(self):
+        return iter(self.process.stdout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # if parsing stopped early, closing the pipe ends objdump too
+        self.process.stdout.close()
+        if self.process.wait() != 0 and exc_type is None:
+            raise IOError("objdump failed on {0}".format(self.path))
+
+
+def get_objdump_version():
+    """Returns the first line of objdump --version. Another objdump may disassemble differently."""
+    return subprocess.check_output(['objdump', '--version']).splitlines()[0]
+
+
+def find_code_sections(path):
+    """Returns names of sections holding code, in file order, as listed by objdump -h."""
+    output = subprocess.check_output(['objdump', '-h', path])
+    sections = []
+    name = None
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) > 1 and fields[0].isdigit():
+            name = fields[1]
+        elif name is not None:
+            if 'CODE' in line:
+                sections.append(name)
+            name = None
+    return sections
+
+
+def parse_elf(arch, path):
+    """Returns instructions and function names, as objdump.parse_deasm."""
+    with ObjdumpOutput(path) as lines:
+        return objdump.parse_deasm(arch, lines)
+
+
+def parse_elf_parallel(arch, path, jobs):
+    """Same as parse_elf, but every code section is disassembled and parsed in its own worker process."""
+    pool = multiprocessing.Pool(jobs)
+    try:
+        return objdump.merge_parsed(arch, pool.imap(parse_section, [(path, section) for section in find_code_sections(path)]))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def parse_section(task):
+    """Runs in a worker process. Instructions come back as arrays and get their arch when merged."""
+    path, section = task
+    with ObjdumpOutput(path, ['-j', section]) as lines:
+        return objdump.parse_deasm(None, lines)
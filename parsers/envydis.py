@@ -1,38 +1,38 @@
+import bisect
+import re
+import string
 from parsers.common import *
 
 
+# address, opcode and the rest, which is separated from opcode by 2 spaces
+line_format = re.compile(r'([^:]*):\s*(\S.*?)  (.*)')
+
+
 def parse_line(arch, disasmline):
-    """Typical format:
+    return arch.Instruction(*split_line(disasmline))
+
+
+def split_line(disasmline):
+    """Returns arguments of arch.Instruction. Typical format:
     012345: 01234567  BC mnemonic operand1 operand2
     address: opcode  FLAGS mnemonic operand1 operand2
     flags: uppercase, instruction: lowercase
     """
-    try:
-        addr, rest = disasmline.split(':', 1)
-    except ValueError as e:
-        raise ParsingError("Line {!r} is not an instruction".format(repr(disasmline)))
-    try:
-        opcode, rest = rest.strip().split("  ", 1)
-    except ValueError, e:
+    match = line_format.match(disasmline)
+    if match is None:
         raise ParsingError("line {0} invalid".format(repr(disasmline)))
-    
+    addr, opcode, rest = match.groups()
+
     # make opcode a X-int tuple, to be similar to py3k bytes
-    opcode.strip()
     if len(opcode) % 2:
         opcode = '0' + opcode
-    
-    opcode = tuple((int(first, 16) * 16 + int(second, 16) for first, second in zip(opcode[::2], opcode[1::2])))
-    
-    # destroy flags, stupid way:
-    flags = 'ABCDEFGHIJKLMNOPQRSTUWVXYZ'
-    
-    instruction = rest
-    for flag in flags:
-        instruction = instruction.replace(flag, '')
-    spl = instruction.strip().split()
+    opcode = tuple(bytearray.fromhex(opcode))
+
+    # destroy flags: all uppercase letters, wherever they are
+    spl = rest.translate(None, string.ascii_uppercase).split()
     mnemonic = spl[0]
     operands = spl[1:]
-    return arch.Instruction(addr, opcode, mnemonic, operands)
+    return addr, opcode, mnemonic, operands
 
 
 def parse_functions_cmap(cmapline):
@@ -43,3 +43,43 @@ def parse_functions_cmap(cmapline):
         addr = int(addr, 16)
         return addr, name
 
+
+def parse_data_cmap(cmapline):
+    """Returns the address and length of a data line, D address [length]. Length is None if the line has none."""
+    if cmapline.startswith('D'):
+        fields = cmapline.split()
+        addr = int(fields[1], 16)
+        try:
+            length = int(fields[2], 16)
+        except (IndexError, ValueError):
+            length = None
+        return addr, length
+
+
+def parse_cmap(lines):
+    """Reads a code space map. Returns function names and a RegionMap of data.
+    Code lines give function starts. A data line without a length lasts until the next function start, or to the end of the code space.
+    """
+    function_mapping = {}
+    data = []
+    for line in lines:
+        line = line.strip()
+        if len(line.split()) < 2:
+            continue
+        result = parse_functions_cmap(line)
+        if result:
+            address, name = result
+            function_mapping[address] = name
+        result = parse_data_cmap(line)
+        if result:
+            data.append(result)
+
+    code_starts = sorted(function_mapping)
+    regions = RegionMap()
+    for start, length in data:
+        if length is not None:
+            regions.add_data(start, start + length)
+        else:
+            position = bisect.bisect_right(code_starts, start)
+            regions.add_data(start, code_starts[position] if position < len(code_starts) else None)
+    return function_mapping, regions
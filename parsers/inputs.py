@@ -0,0 +1,67 @@
+"""Opening of input files, which may be compressed. Compression is recognized by magic bytes, whatever the file name.
+xz and zstd have no module here, so their own tools decompress through a pipe.
+"""
+
+import bz2
+import errno
+import gzip
+import io
+import subprocess
+
+
+magics = [('\x1f\x8b', 'gzip'),
+          ('BZh', 'bzip2'),
+          ('\xfd7zXZ\x00', 'xz'),
+          ('\x28\xb5\x2f\xfd', 'zstd')]
+
+# decompressing commands, taking the path last
+DECOMPRESSORS = {'xz': ['xz', '-dc'],
+                 'zstd': ['zstd', '-dcq']}
+
+
+def get_compression(path):
+    """Returns the name of the compression of the file at path, or None."""
+    with open(path, 'rb') as f:
+        head = f.read(max(len(magic) for magic, name in magics))
+    for magic, name in magics:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+class DecompressorOutput:
+    """Lines decompressed by command from the file at path, as they come. The command failing is an IOError on leaving the with block."""
+    def __init__(self, command, path):
+        self.command = command
+        self.path = path
+        try:
+            self.process = subprocess.Popen(command + [path], stdout=subprocess.PIPE)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            raise IOError("{0}: {1} is needed to decompress it".format(path, command[0]))
+
+    def __iter__(self):
+        return iter(self.process.stdout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # if reading stopped early, closing the pipe ends the command too
+        self.process.stdout.close()
+        if self.process.wait() != 0 and exc_type is None:
+            raise IOError("{0} failed on {1}".format(self.command[0], self.path))
+
+
+def open_input(path):
+    """Returns a file object reading decompressed lines, with no temporary files."""
+    compression = get_compression(path)
+    if compression is None:
+        return open(path)
+    elif compression == 'gzip':
+        # GzipFile reads lines slowly on its own
+        return io.BufferedReader(gzip.GzipFile(path))
+    elif compression == 'bzip2':
+        return bz2.BZ2File(path)
+    return DecompressorOutput(DECOMPRESSORS[compression], path)
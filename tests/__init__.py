@@ -0,0 +1,9 @@
+"""Tests of edeco, importing it from the repository root.
+usage: python -m unittest discover -s tests -t .
+A single module runs as python -m tests.test_links, for example.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""Compares parsers.envydis.split_line with the parser it replaced.
+usage: bench_envydis.py [envydis dump]
+Without a dump, a synthetic one is used.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import parsers.envydis as envydis
+
+
+def old_split_line(disasmline):
+    try:
+        addr, rest = disasmline.split(':', 1)
+    except ValueError as e:
+        raise envydis.ParsingError("Line {!r} is not an instruction".format(repr(disasmline)))
+    try:
+        opcode, rest = rest.strip().split("  ", 1)
+    except ValueError, e:
+        raise envydis.ParsingError("line {0} invalid".format(repr(disasmline)))
+    if len(opcode) % 2:
+        opcode = '0' + opcode
+    opcode = tuple((int(first, 16) * 16 + int(second, 16) for first, second in zip(opcode[::2], opcode[1::2])))
+    flags = 'ABCDEFGHIJKLMNOPQRSTUWVXYZ'
+    instruction = rest
+    for flag in flags:
+        instruction = instruction.replace(flag, '')
+    spl = instruction.strip().split()
+    return addr, opcode, spl[0], spl[1:]
+
+
+def synthetic_dump(count):
+    samples = ['f0970100  mov $r9 0x1',
+               '3f611004  D ld b32 $r1 D[$r2+0x4]',
+               'f53c0c  bra 0x1c',
+               '04ff3c2ef7  ST st b32 D[$r1] $r2',
+               'f8e  ret']
+    return ['{0:08x}: {1}'.format(i * 4, samples[i % len(samples)]) for i in range(count)]
+
+
+def measure(split, lines):
+    start = time.time()
+    results = [split(line) for line in lines]
+    return time.time() - start, results
+
+
+if len(sys.argv) > 1:
+    with open(sys.argv[1]) as dump:
+        lines = [line.strip() for line in dump]
+    lines = [line for line in lines if line and not line.startswith('//') and not line.startswith('[')]
+else:
+    lines = synthetic_dump(200000)
+
+parsable = []
+for line in lines:
+    try:
+        old_split_line(line)
+    except envydis.ParsingError:
+        continue
+    parsable.append(line)
+
+old_time, old_results = measure(old_split_line, parsable)
+new_time, new_results = measure(envydis.split_line, parsable)
+if old_results != new_results:
+    print 'results differ'
+    sys.exit(1)
+print '{0} lines: old {1:.3f}s, new {2:.3f}s, {3:.1f}x'.format(len(parsable), old_time, new_time, old_time / new_time)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""Cycle equivalence against dominator trees, on random graphs. Nesting of regions.
+"""
+
+import random
+import unittest
+
+from common.cycle_equivalence import CycleEquivalence
+from common.dominators import DominatorTree, PostDominatorTree
+
+
+class Node:
+    def __init__(self, name):
+        self.name = name
+        self.following = []
+
+    def __repr__(self):
+        return self.name
+
+
+def random_graph(rand, count, loops):
+    """Returns the head of a graph of count nodes, where every node but the last leads to one or two others. Without loops, those are later nodes only."""
+    nodes = [Node('n' + str(i)) for i in range(count)]
+    for i, node in enumerate(nodes[:-1]):
+        targets = nodes if loops else nodes[i + 1:]
+        if rand.random() < 0.6:
+            node.following.append(nodes[i + 1])
+        else:
+            node.following.append(rand.choice(targets))
+        if rand.random() < 0.4:
+            next = rand.choice(targets)
+            if next not in node.following:
+                node.following.append(next)
+    return nodes[0]
+
+
+def reaches(equivalence, source, target, skipped):
+    """True if a path leads from node id source to node id target without using edges with skipped ids."""
+    visited = set([source])
+    stack = [source]
+    while stack:
+        node = stack.pop()
+        if node == target:
+            return True
+        for edge_id, edge_source in enumerate(equivalence.sources):
+            next = equivalence.targets[edge_id]
+            if edge_source == node and edge_id not in skipped and next not in visited:
+                visited.add(next)
+                stack.append(next)
+    return False
+
+
+class CycleEquivalenceTest(unittest.TestCase):
+    graphs = 300
+
+    def test_random_dags(self):
+        """Without loops, edges are equivalent when one dominates the other and the other post-dominates it."""
+        rand = random.Random(0)
+        for i in range(self.graphs):
+            head = random_graph(rand, rand.randrange(2, 14), loops=False)
+            equivalence = CycleEquivalence(head)
+
+            # edges become nodes of their own, so that trees of nodes tell about edges
+            end = Node('end')
+            def follow(node):
+                if isinstance(node, tuple):
+                    return [node[1]]
+                if node is end:
+                    return []
+                return [(node, next) for next in node.following] or [end]
+            doms = DominatorTree(head, follow)
+            postdoms = PostDominatorTree(head, follow)
+
+            edge_ids = dict((edge, edge_id) for edge_id, edge in enumerate(equivalence.edges) if edge is not None)
+            for a in edge_ids:
+                for b in edge_ids:
+                    expected = (doms.dominates(a, b) and postdoms.post_dominates(b, a)) or (doms.dominates(b, a) and postdoms.post_dominates(a, b))
+                    self.assertEqual(equivalence.classes[edge_ids[a]] == equivalence.classes[edge_ids[b]], expected, (i, a, b))
+
+            for edge_ids in equivalence.members:
+                edges = [equivalence.edges[edge_id] for edge_id in edge_ids if equivalence.edges[edge_id] is not None]
+                for a, b in zip(edges, edges[1:]):
+                    self.assertTrue(doms.dominates(a, b), (i, a, b))
+
+    def test_random_loops(self):
+        """Edges are equivalent when no cycle goes through one of them and not the other."""
+        rand = random.Random(0)
+        checked = 0
+        for i in range(self.graphs):
+            equivalence = CycleEquivalence(random_graph(rand, rand.randrange(2, 14), loops=True))
+            end_id = len(equivalence.nodes) - 1
+            if not all(reaches(equivalence, node_id, end_id, ()) for node_id in range(end_id)):
+                continue
+            checked += 1
+
+            def always_with(a, b):
+                """True if every cycle through b goes through a."""
+                return a == b or not reaches(equivalence, equivalence.targets[b], equivalence.sources[b], (a, b))
+            edge_count = len(equivalence.edges)
+            for a in range(edge_count):
+                for b in range(edge_count):
+                    expected = always_with(a, b) and always_with(b, a)
+                    self.assertEqual(equivalence.classes[a] == equivalence.classes[b], expected, (i, a, b))
+        self.assertTrue(checked > self.graphs / 2)
+
+
+class RegionTreeTest(unittest.TestCase):
+    def test_nested_diamond(self):
+        a, b, c, d, e, f = [Node(name) for name in 'abcdef']
+        a.following = [b]
+        b.following = [c, d]
+        c.following = [e]
+        d.following = [e]
+        e.following = [f]
+        root = CycleEquivalence(a).root
+        self.assertEqual([(region.entry, region.exit) for region in root.children], [((a, b), (e, f)), ((e, f), None)])
+        diamond = root.children[0]
+        self.assertEqual([(region.entry, region.exit) for region in diamond.children], [((b, c), (c, e)), ((b, d), (d, e))])
+        self.assertTrue(all(region.parent is diamond and not region.children for region in diamond.children))
+
+
+if __name__ == '__main__':
+    unittest.main()
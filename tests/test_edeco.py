@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+"""Command line runs of edeco.py.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+EDECO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'edeco.py')
+
+DEASM = '''0000000000000000 <main>:
+   0:\te8 05 00 00 00       \tcallq  a <helper>
+   5:\tc3                   \tretq   
+0000000000000010 <helper>:
+  10:\t90                   \tnop
+  11:\tc3                   \tretq   
+'''
+
+
+class JobsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.deasm = os.path.join(self.directory, 'in.asm')
+        with open(self.deasm, 'w') as deasm:
+            deasm.write(DEASM)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_edeco(self, *args):
+        deco = os.path.join(self.directory, 'out.deco')
+        process = subprocess.Popen([sys.executable, EDECO, '-m', 'x86_64', self.deasm, deco] + list(args), cwd=self.directory, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = process.communicate()[0]
+        self.assertEqual(process.returncode, 0, output)
+        return output
+
+    def test_address_out_of_code(self):
+        for jobs in ['1', '2']:
+            output = self.run_edeco('-j', jobs, '-f', '0x999')
+            self.assertIn('Address 0x999 out of this code block.', output)
+
+
+if __name__ == '__main__':
+    unittest.main()
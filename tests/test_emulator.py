@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+"""Flow detection on long if/else chains, which used to exhaust the recursion limit.
+"""
+
+import sys
+import unittest
+
+import arches.x86_64 as arch
+from common import graphs
+from parsers import objdump
+
+
+def if_chain(count):
+    """Returns objdump lines of a function with count conditional jumps, each over one instruction."""
+    lines = ['00 <chain>:']
+    for i in range(count):
+        lines.append('    {0:x}:  00      jne {1:x}'.format(2 * i, 2 * i + 2))
+        lines.append('    {0:x}:  00      nop'.format(2 * i + 1))
+    lines.append('    {0:x}:  00      ret'.format(2 * count))
+    return lines
+
+
+class IfChainTest(unittest.TestCase):
+    count = 20000 # instructions, way past the recursion limit
+
+    def setUp(self):
+        self.instructions, function_mapping = objdump.parse_deasm(arch, if_chain(self.count // 2))
+
+    def check_graph(self, graph_head):
+        nodes = list(graphs.dfs_preorder(graph_head))
+        self.assertTrue(len(nodes) > sys.getrecursionlimit())
+        ends = [node for node in nodes if not node.following]
+        self.assertEqual(len(ends), 1)
+
+    def test_emulator(self):
+        self.check_graph(arch.detect_flow(self.instructions, 0, self.instructions.address_index))
+
+    def test_shared_blocks(self):
+        blocks = arch.find_blocks(self.instructions, self.instructions.address_index)
+        self.check_graph(arch.detect_flow(self.instructions, 0, self.instructions.address_index, blocks))
+
+
+if __name__ == '__main__':
+    unittest.main()
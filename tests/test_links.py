@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+"""Neighbour lists behaving like the plain lists they replace.
+"""
+
+import random
+import unittest
+
+from common.links import Links, IndexedLinks, INDEXED_LENGTH
+
+
+class LinksTest(unittest.TestCase):
+    def test_repeated_node(self):
+        links = Links(['a', 'b', 'a'])
+        links.remove('a')
+        self.assertEqual(list(links), ['b', 'a'])
+        self.assertTrue('a' in links)
+        links.remove('a')
+        self.assertFalse('a' in links)
+        self.assertRaises(ValueError, links.remove, 'a')
+
+    def test_same_as_list(self):
+        rand = random.Random(0)
+        links = Links()
+        expected = []
+        for i in range(2000):
+            if expected and rand.random() < 0.4:
+                node = rand.choice(expected)
+                links.remove(node)
+                expected.remove(node)
+            else:
+                node = rand.randrange(10)
+                links.append(node)
+                expected.append(node)
+            self.assertEqual(list(links), expected)
+            self.assertEqual(len(links), len(expected))
+            if expected:
+                self.assertEqual(links[0], expected[0])
+                self.assertEqual(links[-1], expected[-1])
+            self.assertEqual(links[:], expected)
+            self.assertEqual(set(links), set(expected))
+        self.assertTrue(isinstance(links, IndexedLinks))
+        self.assertTrue(list.__len__(links) <= 2 * len(expected) + INDEXED_LENGTH)
+
+
+if __name__ == '__main__':
+    unittest.main()
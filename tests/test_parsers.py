@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""Code space maps and the regions they drop from envydis dumps. Objdump lines that aren't whole instructions. Instruction views. Compressed inputs.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import fuc as arch
+import arches.x86_64
+import parsers.envydis as envydis
+from parsers import objdump, inputs, ParsingError
+
+
+def dump(addresses):
+    return ['{0:08x}: f0970100  mov $r9 0x1'.format(address) for address in addresses]
+
+
+class CmapRegionsTest(unittest.TestCase):
+    def parse(self, cmap, addresses):
+        function_mapping, regions = envydis.parse_cmap(cmap)
+        instructions = envydis.parse_instructions(envydis, arch, dump(addresses), regions)
+        return function_mapping, list(instructions.addresses)
+
+    def test_code_after_sized_data(self):
+        function_mapping, addresses = self.parse(['C 0 main', 'D 10 8'], range(0, 0x30, 4))
+        self.assertEqual(function_mapping, {0: 'main'})
+        self.assertEqual(addresses, [0x0, 0x4, 0x8, 0xc, 0x18, 0x1c, 0x20, 0x24, 0x28, 0x2c])
+
+    def test_data_ends_at_next_function(self):
+        function_mapping, addresses = self.parse(['C 0 main', 'D 8', 'C 20 ?'], range(0, 0x30, 4))
+        self.assertEqual(function_mapping, {0: 'main', 0x20: None})
+        self.assertEqual(addresses, [0x0, 0x4, 0x20, 0x24, 0x28, 0x2c])
+
+    def test_trailing_data(self):
+        function_mapping, addresses = self.parse(['C 0 main', 'D 8'], range(0, 0x30, 4))
+        self.assertEqual(addresses, [0x0, 0x4])
+
+    def test_overlapping_data(self):
+        function_mapping, regions = envydis.parse_cmap(['D 10 10', 'D 18 10', 'D 40 4'])
+        self.assertEqual(zip(regions.starts, regions.ends), [(0x10, 0x28), (0x40, 0x44)])
+        self.assertFalse(regions.is_data(0xf))
+        self.assertTrue(regions.is_data(0x27))
+        self.assertFalse(regions.is_data(0x28))
+
+
+class ObjdumpTest(unittest.TestCase):
+    lines = ['0000000000400000 <main>:',
+             '  400000:\t48 b8 00 00 00 00 00 \tmovabs $0x0,%rax',
+             '  400007:\t00 00 00 ',
+             '  40000a:\tc3                   \tretq   ',
+             '\t...',
+             '0000000000400020 <next>:',
+             '  400020:\t90                   \tnop',
+             '  400021:\tc3                   \tretq   ']
+
+    def test_continued_opcode(self):
+        instructions, function_mapping = objdump.parse_deasm(arches.x86_64, self.lines)
+        self.assertEqual(function_mapping, {0x400000: 'main', 0x400020: 'next'})
+        self.assertEqual(list(instructions.addresses), [0x400000, 0x40000a, 0x400020, 0x400021])
+        self.assertEqual(instructions[0].opcode, (0x48, 0xb8) + (0,) * 8)
+        self.assertEqual(instructions[0].mnemonic, 'movabs')
+        self.assertEqual(instructions[1].opcode, (0xc3,))
+
+    def test_continuation_alone(self):
+        self.assertRaises(ParsingError, objdump.parse_instruction, arches.x86_64, self.lines[2])
+
+
+class InstructionTableTest(unittest.TestCase):
+    def setUp(self):
+        self.instructions = objdump.parse_deasm(arches.x86_64, ObjdumpTest.lines)[0]
+
+    def test_views_are_dropped(self):
+        view = self.instructions[1]
+        self.assertTrue(self.instructions[1] is view)
+        del view
+        self.assertEqual(len(self.instructions.views), 0)
+
+    def test_marks_are_kept(self):
+        self.instructions[1].mark_chain('0')
+        self.instructions[2].replaced_by = 'operation'
+        self.assertEqual(len(self.instructions.views), 0)
+        self.assertEqual(self.instructions[1].used_in, ['0'])
+        self.assertEqual(self.instructions[2].replaced_by, 'operation')
+        self.assertFalse(self.instructions[3].used_in)
+        self.assertEqual(sorted(self.instructions.marks), [1, 2])
+
+
+class InputsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'in.asm')
+        with open(self.path, 'w') as f:
+            f.write(''.join(line + '\n' for line in ObjdumpTest.lines))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_compressed(self, command, compression):
+        try:
+            subprocess.check_call(command + [self.path])
+        except OSError:
+            self.skipTest('{0} is not installed'.format(command[0]))
+        path, = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+        self.assertEqual(inputs.get_compression(path), compression)
+        with inputs.open_input(path) as lines:
+            self.assertEqual([line.rstrip('\n') for line in lines], ObjdumpTest.lines)
+
+    def test_gzip(self):
+        self.check_compressed(['gzip'], 'gzip')
+
+    def test_xz(self):
+        self.check_compressed(['xz'], 'xz')
+
+    def test_zstd(self):
+        self.check_compressed(['zstd', '-q', '--rm'], 'zstd')
+
+    def test_plain(self):
+        self.assertEqual(inputs.get_compression(self.path), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,20 @@
 from instructions import Instruction
 import vp1_flow
 
-def find_function_addresses(instructions):
+def find_function_addresses(instructions, regions=None):
+    """Leaves out calls into data regions."""
     addresses = []
     for instruction in instructions:
         call_target = instruction.get_call_target()
         if call_target is not None:
             addresses.append(call_target)
-    return set(addresses)
+    return set(address for address in addresses if regions is None or not regions.is_data(address))
     
     
-def detect_flow(instructions, start_address):
-    flow_emulator = vp1_flow.Emulator(instructions, start_address)
+def find_blocks(instructions, address_index=None):
+    return vp1_flow.find_blocks(instructions, address_index)
+
+
+def detect_flow(instructions, start_address, address_index=None, blocks=None):
+    flow_emulator = vp1_flow.Emulator(instructions, start_address, address_index, blocks)
     return flow_emulator.flow
@@ -24,6 +24,8 @@ def get_exec_unit(opcode):
 
 
 class VP1Instruction(instructions.GenericInstruction):
+    __slots__ = ('exec_unit',)
+
     def __init__(self, arch, address, opcode, mnemonic, operands):
         instructions.GenericInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
         self.exec_unit = get_exec_unit(opcode)
@@ -45,6 +47,8 @@ class VP1Instruction(instructions.GenericInstruction):
         
 
 class SimpleInstruction(VP1Instruction):
+    __slots__ = ()
+
     def get_branch_target(self):
         return None
 
@@ -63,6 +67,8 @@ class SimpleInstruction(VP1Instruction):
 
 class BRAInstruction(VP1Instruction):
     """Both loop and regular"""
+    __slots__ = ('condition', 'target')
+
     def __init__(self, arch, address, opcode, mnemonic, operands):
         VP1Instruction.__init__(self, arch, address, opcode, mnemonic, operands)
         self.condition = operands[0:-1]
@@ -93,6 +99,8 @@ class BRAInstruction(VP1Instruction):
 
 
 class EXITInstruction(VP1Instruction):
+    __slots__ = ()
+
     def get_branch_target(self):
         return None
         
@@ -110,6 +118,8 @@ class EXITInstruction(VP1Instruction):
 
 
 class RETInstruction(VP1Instruction):
+    __slots__ = ()
+
     def get_branch_target(self):
         return None
         
@@ -127,6 +137,8 @@ class RETInstruction(VP1Instruction):
 
 
 class CALLInstruction(SimpleInstruction):
+    __slots__ = ('target',)
+
     def __init__(self, arch, address, opcode, mnemonic, operands):
         VP1Instruction.__init__(self, arch, address, opcode, mnemonic, operands)
         self.target = parse_imm(operands[-1])
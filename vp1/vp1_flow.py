@@ -8,79 +8,131 @@ SCALAR_UNIT = '$r_u'
 BRANCH_UNIT = 'br_u'
 
 
+def get_bundle(instructions, index):
+    bundle_index = index / 4
+    return instructions[bundle_index * 4:(bundle_index + 1) * 4]
+
+
+def will_jump(instructions, index):
+    """True if a pending jump happens right after the instruction at index."""
+    next_index = index + 1
+
+    in_bundle_index = next_index % 4
+    if in_bundle_index == 0: # check inter-bundle boundary
+        return True
+        
+    next_insn_bundle = get_bundle(instructions, next_index)
+    exec_unit = instructions[next_index].exec_unit
+    for instruction in next_insn_bundle[:in_bundle_index]: # check if execution unit was already used
+        if instruction.exec_unit == exec_unit:
+            return True
+    return False
+
+
+def summarize_instruction(instruction):
+    """Returns the flow kind and target address of a vp1 instruction."""
+    target = instruction.get_branch_target()
+    if target is not None:
+        if not (isinstance(target, int) or isinstance(target, long)):
+            return DYNAMIC, None
+        if instruction.get_branch_condition() is None:
+            return JUMP, target
+        return CONDITIONAL_JUMP, target
+    elif instruction.is_return():
+        return RETURN, None
+    elif instruction.is_exit():
+        return EXIT, None
+    elif instruction.get_call_target() is not None:
+        return CALL, instruction.get_call_target()
+    return FALLTHROUGH, None
+
+
+def find_flow_summary(instructions, address_index):
+    return FlowSummary(instructions, address_index, summarize_instruction)
+
+
+def find_blocks(instructions, address_index=None):
+    """Marks jump targets, fall-throughs after delay slots and exits in a single pass."""
+    if address_index is None:
+        address_index = AddressIndex(instruction.address for instruction in instructions)
+    summary = find_flow_summary(instructions, address_index)
+    leaders = [0]
+    stops = []
+    for i, kind in enumerate(summary.kinds):
+        if kind == JUMP or kind == CONDITIONAL_JUMP or kind == DYNAMIC or kind == RETURN:
+            stops.append(i)
+            if summary.targets[i] != NO_TARGET:
+                leaders.append(summary.targets[i])
+            landing = i + 1
+            while landing < len(instructions) - 1 and not will_jump(instructions, landing):
+                landing += 1
+            leaders.append(landing + 1)
+        elif kind == EXIT:
+            stops.append(i)
+            leaders.append(i + 1)
+    return BlockTable(leaders, stops, len(instructions), summary)
+
+
 class Emulator(FunctionFlowEmulator):
     """Finds flow graph by emulating instructions. Specific to vp1 and its model of branch delays.
     """
     def get_bundle(self, index):
-        bundle_index = index / 4
-        return self.instructions[bundle_index * 4:(bundle_index + 1) * 4]
+        return get_bundle(self.instructions, index)
+
+    def find_summary(self):
+        return LazyFlowSummary(self.instructions, self.address_index, summarize_instruction)
 
     def follow_subflow(self, source, index):
 #        print 'next from', hex(self.instructions[index].address) + ':' + str(index % 4)
 #        raw_input()
-        def will_jump():
+        def jump_now():
             if machine_jump_fresh: # check first obligatory delay slot
                 return False
-            
-            next_index = current_index + 1
-
-            in_bundle_index = next_index % 4
-            if in_bundle_index == 0: # check inter-bundle boundary
-                return True
-                
-            next_insn_bundle = self.get_bundle(next_index)
-            exec_unit = self.instructions[next_index].exec_unit
-            for instruction in next_insn_bundle[:in_bundle_index]: # check if execution unit was already used
-                if instruction.exec_unit == exec_unit:
-                    return True
-            return False
+            return will_jump(self.instructions, current_index)
 
         current_index = index
         
-        machine_jump_target = None
+        # index of the instruction which started the pending jump, and its kind
+        machine_jump_source = None
         machine_jump_reason = None
         machine_jump_fresh = False
         
-        for instruction in self.instructions[current_index:]:
+        kinds = self.summary.kinds
+        while current_index < len(self.instructions):
+            if machine_jump_reason is None:
+                current_index = self.get_run_end(current_index)
+            kind = kinds[current_index]
             machine_jump_fresh = False
-            jump_target = instruction.get_branch_target()
-            if jump_target is not None:
+            if kind == JUMP or kind == CONDITIONAL_JUMP or kind == DYNAMIC or kind == RETURN:
      #           print 'jump from', hex(instruction.address) + ':' + str(current_index % 4)
-                if not (isinstance(jump_target, int) or isinstance(jump_target, long)):
-                    raise EmulationUnsupported("Function can't be traced, contains a dynamic jump at 0x{0:x}.".format(instruction.address))
-                if machine_jump_reason:
-                    raise InvalidCodeError("Trying to jump but there's already a jump in progress: " + str(instruction))
-                machine_jump_target = jump_target
-                machine_jump_reason = instruction
-                machine_jump_fresh = True
-            elif instruction.is_return():
-                if machine_jump_reason:
-                    raise InvalidCodeError("Trying to jump but there's already a jump in progress: " + str(instruction))                   
-                machine_jump_reason = instruction
+                if kind == DYNAMIC:
+                    raise EmulationUnsupported("Function can't be traced, contains a dynamic jump at 0x{0:x}.".format(self.instructions[current_index].address))
+                if machine_jump_reason is not None:
+                    raise InvalidCodeError("Trying to jump but there's already a jump in progress: " + str(self.instructions[current_index]))
+                machine_jump_source = current_index
+                machine_jump_reason = kind
                 machine_jump_fresh = True
-            elif instruction.is_exit():
+            elif kind == EXIT:
                 subflow = self.commit_flow(source, index, current_index)
                 add_edge(subflow, self._end)
 #                print subflow, 'is *FINISH*ed'
                 return
             
             # jump is checked _before_ next instruction. It's possible there is no more instructions
-            if machine_jump_reason is not None and will_jump():
+            if machine_jump_reason is not None and jump_now():
     #            print 'leaving after', hex(instruction.address) + ':' + str(current_index % 4)
-   #             print  machine_jump_reason,  machine_jump_reason.get_branch_condition()
-                if machine_jump_reason.is_return():
+                if machine_jump_reason == RETURN:
                     subflow = self.commit_flow(source, index, current_index)
                     add_edge(subflow, self._end)
-                elif machine_jump_reason.get_branch_condition() is None:
+                elif machine_jump_reason == JUMP:
   #                  print 'single'
                     subflow = self.commit_flow(source, index, current_index)
-                    self.find_subflow(subflow, self.get_index(machine_jump_target))
+                    self.queue_subflows(subflow, self.get_target_index(machine_jump_source))
                 else:
  #                   print 'multi'
                     subflow = self.commit_flow(source, index, current_index)
-                    self.find_subflow(subflow, current_index + 1)
 #                    print 'again after', hex(instruction.address) + ':' + str(current_index % 4)
-                    self.find_subflow(subflow, self.get_index(machine_jump_target))
+                    self.queue_subflows(subflow, current_index + 1, self.get_target_index(machine_jump_source))
                 return
 
             post_subflow = self.find_existing_subflow(current_index + 1)
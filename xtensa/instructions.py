@@ -13,10 +13,11 @@ def parse_imm(operand):
 
 
 def parse_reg(operand):
+    """Returns the register id."""
     if not operand.startswith("$a"):
         raise ValueError("Register type unsupported " + operand)
     else:
-        return operand
+        return machine.registers.intern(operand)
 
 
 def parse_memory_address(operand):
@@ -35,11 +36,16 @@ def parse_memory_address(operand):
 
 
 class XtensaInstruction(instructions.GenericInstruction, flow.emulator.FlowInstructionMixIn):
+    __slots__ = ()
+
     def calls_function(self):
         raise NotImplementedError
 
 
 class SimpleInstruction(XtensaInstruction):
+    __slots__ = ()
+    flow_kind = flow.emulator.FLOW_NONE
+
     def jumps(self):
         return False
     
@@ -51,14 +57,16 @@ class SimpleInstruction(XtensaInstruction):
 
 
 class BranchInstruction(XtensaInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        XtensaInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        if mnemonic.endswith('z') or mnemonic.endswith('z.n'):
-            target = operands[1]
+    __slots__ = ('_target',)
+    flow_kind = flow.emulator.FLOW_JUMP
+
+    @instructions.operand_property
+    def target(self):
+        if self.mnemonic.endswith('z') or self.mnemonic.endswith('z.n'):
+            target = self.operands[1]
         else:
-            target = operands[2]
-        
-        self.target = parse_imm(target)
+            target = self.operands[2]
+        return parse_imm(target)
 
     def jumps(self):
         return True
@@ -72,9 +80,12 @@ class BranchInstruction(XtensaInstruction):
 
 
 class JumpInstruction(XtensaInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        XtensaInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.target = parse_imm(operands[0])
+    __slots__ = ('_target',)
+    flow_kind = flow.emulator.FLOW_JUMP
+
+    @instructions.operand_property
+    def target(self):
+        return parse_imm(self.operands[0])
 
     def jumps(self):
         return True
@@ -87,9 +98,12 @@ class JumpInstruction(XtensaInstruction):
 
 
 class JumpDynamicInstruction(XtensaInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        XtensaInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.target = parse_reg(operands[0])
+    __slots__ = ('_target',)
+    flow_kind = flow.emulator.FLOW_JUMP
+
+    @instructions.operand_property
+    def target(self):
+        return parse_reg(self.operands[0])
 
     def jumps(self):
         return True
@@ -102,6 +116,9 @@ class JumpDynamicInstruction(XtensaInstruction):
 
 
 class RetInstruction(XtensaInstruction):
+    __slots__ = ()
+    flow_kind = flow.emulator.FLOW_BREAK
+
     def jumps(self):
         return False
         
@@ -114,9 +131,12 @@ class RetInstruction(XtensaInstruction):
 
 class CallInstruction(XtensaInstruction):
     """Doesn't support the 0x8 thing (first operand)"""
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        XtensaInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.function = parse_imm(operands[1])
+    __slots__ = ('_function',)
+    flow_kind = flow.emulator.FLOW_CALL
+
+    @instructions.operand_property
+    def function(self):
+        return parse_imm(self.operands[1])
         
     def jumps(self):
         return False
@@ -129,11 +149,25 @@ class CallInstruction(XtensaInstruction):
 
 
 class StoreInstruction(SimpleInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        SimpleInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.source = parse_reg(operands[0])
-        self.base, self.offset = parse_memory_address(operands[1])
-        self.size = 4
+    __slots__ = ('_source', '_memory_address')
+    size = 4
+    offset_in_register = False
+
+    @instructions.operand_property
+    def source(self):
+        return parse_reg(self.operands[0])
+
+    @instructions.operand_property
+    def memory_address(self):
+        return parse_memory_address(self.operands[1])
+
+    @property
+    def base(self):
+        return self.memory_address[0]
+
+    @property
+    def offset(self):
+        return self.memory_address[1]
 
     def stores_memory(self):
         return True
@@ -144,20 +178,30 @@ class StoreInstruction(SimpleInstruction):
 
 
 class MoveImmediateInstruction(SimpleInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        SimpleInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.value = parse_imm(operands[1])
-        self.destination = parse_reg(operands[0])
+    __slots__ = ('_value', '_destination')
+
+    @instructions.operand_property
+    def value(self):
+        return parse_imm(self.operands[1])
+
+    @instructions.operand_property
+    def destination(self):
+        return parse_reg(self.operands[0])
     
     def evaluate(self, machine_state):
         machine_state.write_register(self.destination, self.value)
 
 
 class LoadConstantInstruction(SimpleInstruction):
-    def __init__(self, arch, address, opcode, mnemonic, operands):
-        SimpleInstruction.__init__(self, arch, address, opcode, mnemonic, operands)
-        self.value = parse_imm(operands[2])
-        self.destination = parse_reg(operands[0])
+    __slots__ = ('_value', '_destination')
+
+    @instructions.operand_property
+    def value(self):
+        return parse_imm(self.operands[2])
+
+    @instructions.operand_property
+    def destination(self):
+        return parse_reg(self.operands[0])
     
     def get_value(self, context, reg_spec):
         print self
@@ -213,3 +257,7 @@ instruction_map = {'retw': RetInstruction,
 
 def Instruction(address, opcode, mnemonic, operands):
     return instructions.Instruction(machine.Architecture, address, opcode, mnemonic, operands, instruction_map, SimpleInstruction)
+
+
+def flow_kind(mnemonic):
+    return instructions.get_flow_kind(mnemonic, instruction_map, SimpleInstruction)